@@ -0,0 +1,74 @@
+"""Speed, chunk size distribution and prompt tokens of the recursive and token chunkers.
+
+Chunks the documents in DOCUMENTS_DIR when there are any, otherwise generated
+policy-style text. Sizes are measured in TOKENIZER_ENCODING tokens. Prompt
+tokens are those of k search results as PolicySearch formats them (content
+truncated to 500 characters). Run from the backend directory:
+
+    python -m benchmarks.chunkers --k 3 --repeat 3
+"""
+import argparse
+import time
+import numpy as np
+from src.config import DOCUMENTS_DIR, CHUNK_SIZE, CHUNK_TOKENS
+from src.ingestion.chunkers import CHUNKERS, TokenChunker
+from src.ingestion.document_loader import DocumentLoader
+
+def corpus_documents(loader: DocumentLoader, workers: int):
+    documents = loader.load_documents(DOCUMENTS_DIR, workers)
+    if documents:
+        pages = sum(len(doc["segments"]) for doc in documents)
+        print(f"Corpus: {len(documents)} documents ({pages} pages/paragraphs) from {DOCUMENTS_DIR}")
+        return documents
+
+    rng = np.random.default_rng(0)
+    topics = ["annual leave", "parental leave", "travel expenses", "health insurance", "remote work"]
+    documents = []
+    for i in range(20):
+        paragraphs = []
+        for j in range(200):
+            sentences = [f"Section {j}.{s}: employees in band {rng.integers(1, 8)} are entitled to "
+                         f"{rng.integers(1, 30)} days of {topics[(i + s) % len(topics)]} per year."
+                         for s in range(rng.integers(1, 8))]
+            paragraphs.append((j // 20 + 1, " ".join(sentences)))
+        documents.append({"segments": paragraphs, "metadata": {"source": f"generated-{i}.pdf"}})
+    print(f"Corpus: {len(documents)} generated documents")
+    return documents
+
+def percentiles(values) -> str:
+    p5, p50, p95 = np.percentile(values, [5, 50, 95])
+    return f"{p5:>6.0f}{p50:>6.0f}{p95:>6.0f}{max(values):>6.0f}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=3, help="Search results per prompt")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per chunker (best is reported)")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    counter = TokenChunker()
+    documents = corpus_documents(DocumentLoader("recursive"), args.workers)
+    print(f"Budgets: recursive {CHUNK_SIZE} characters, token {CHUNK_TOKENS} tokens\n")
+    print(f"{'chunker':<11}{'chunks':>8}{'chunks/s':>11}{'MB/s':>8}   "
+          f"{'tokens p5/p50/p95/max':<24}{'prompt tokens':>14}{'truncated':>11}")
+
+    for name in CHUNKERS:
+        loader = DocumentLoader(name)
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            chunks = loader.chunk_documents(documents)
+            best = min(best, time.perf_counter() - start)
+
+        texts = [chunk["text"] for chunk in chunks]
+        tokens = [counter.count_tokens(text) for text in texts]
+        megabytes = sum(len(text) for _, text in (s for doc in documents for s in doc["segments"])) / 1e6
+        # Prompt size of k consecutive results, as PolicySearch passes them to the agent
+        prompts = [sum(counter.count_tokens(text[:500]) for text in texts[i:i + args.k])
+                   for i in range(0, max(1, len(texts) - args.k + 1), args.k)]
+        truncated = np.mean([len(text) > 500 for text in texts]) * 100
+        print(f"{name:<11}{len(chunks):>8}{len(chunks) / best:>11.0f}{megabytes / best:>8.2f}   "
+              f"{percentiles(tokens):<24}{np.mean(prompts):>14.0f}{truncated:>10.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Parity, single-query latency and batch throughput of the torch and ONNX int8 encoders.
+
+Uses chunk texts from the current vector store when one exists, otherwise
+generated policy-style sentences. Run from the backend directory:
+
+    python -m benchmarks.encoder_backends --batch-size 64 --texts 1024
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+from src.config import VECTOR_STORE_PATH, ONNX_NUM_THREADS, ONNX_PARITY_TOLERANCE
+from src.ingestion.chunk_store import ChunkStore
+from src.ingestion.encoders import TorchEncoder, OnnxEncoder, PARITY_SENTENCES, check_parity
+
+def corpus_texts(limit: int):
+    """Chunk texts from the current snapshot, or generated ones if there is none"""
+    root = f"{VECTOR_STORE_PATH}.snapshots"
+    try:
+        with open(os.path.join(root, "history.json"), "r", encoding="utf-8") as f:
+            current = json.load(f)["current"]
+        chunks = ChunkStore.load(os.path.join(root, current, "chunks"))
+        texts = [text for _, text in zip(range(limit), chunks.texts())]
+    except (OSError, ValueError, KeyError, TypeError):
+        texts = []
+    if texts:
+        print(f"Texts: {len(texts)} chunks from the current vector store")
+        return texts
+
+    topics = ["vacation days", "parental leave", "travel expenses", "health insurance", "remote work"]
+    texts = [f"{PARITY_SENTENCES[i % len(PARITY_SENTENCES)]} This section covers {topics[i % len(topics)]} "
+             f"for employees in band {i % 7}, effective from year {2020 + i % 5}." for i in range(limit)]
+    print(f"Texts: {len(texts)} generated sentences")
+    return texts
+
+def latency_ms(encoder, queries, runs: int):
+    timings = []
+    for i in range(runs):
+        start = time.perf_counter()
+        encoder.encode([queries[i % len(queries)]])
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 95)
+
+def throughput(encoder, texts, batch_size: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        encoder.encode(texts[i:i + batch_size])
+    return len(texts) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=1024)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200, help="Single-query latency runs")
+    parser.add_argument("--threads", type=int, default=ONNX_NUM_THREADS)
+    args = parser.parse_args()
+
+    texts = corpus_texts(args.texts)
+    encoders = {"torch": TorchEncoder(), f"onnx-int8 ({args.threads} threads)": OnnxEncoder(num_threads=args.threads)}
+    reference, candidate = encoders.values()
+
+    report = check_parity(reference, candidate, texts[:256], ONNX_PARITY_TOLERANCE)
+    print(f"\nParity on {report['texts']} texts: mean cosine {report['mean_cosine']:.4f}, "
+          f"min {report['min_cosine']:.4f} (tolerance {report['tolerance']}) -> "
+          f"{'PASS' if report['passed'] else 'FAIL'}")
+
+    print(f"\n{'encoder':<26}{'p50 ms':>10}{'p95 ms':>10}{'texts/s':>12}")
+    for name, encoder in encoders.items():
+        encoder.encode(texts[:args.batch_size])  # Warm up
+        p50, p95 = latency_ms(encoder, PARITY_SENTENCES, args.queries)
+        print(f"{name:<26}{p50:>10.2f}{p95:>10.2f}{throughput(encoder, texts, args.batch_size):>12.1f}")
+
+if __name__ == "__main__":
+    main()
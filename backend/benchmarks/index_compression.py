@@ -0,0 +1,85 @@
+"""Memory per chunk and recall@k of each index type against the exact flat baseline.
+
+Uses the exact vectors of the current vector store when one exists, otherwise
+a synthetic clustered corpus. Run from the backend directory:
+
+    python -m benchmarks.index_compression --k 3 --queries 500
+"""
+import argparse
+import time
+import numpy as np
+import faiss
+from src.ingestion import vector_store
+from src.ingestion.chunk_store import ChunkStore
+from src.ingestion.vector_store import IndexSnapshot, INDEX_TYPES
+
+def synthetic_corpus(num_vectors: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Normalized vectors drawn around a few hundred topic centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((256, dim)).astype(np.float32)
+    vectors = centroids[rng.integers(0, len(centroids), num_vectors)]
+    vectors += 0.5 * rng.standard_normal(vectors.shape).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found.tolist(), truth.tolist())]))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--synthetic", type=int, default=50_000,
+                        help="Corpus size when no vector store with stored vectors is loaded")
+    args = parser.parse_args()
+
+    vectors = vector_store.documents.vectors
+    if vectors is not None and len(vectors):
+        vectors = np.ascontiguousarray(vectors)
+        print(f"Corpus: {len(vectors)} chunks from the current vector store")
+    else:
+        vectors = synthetic_corpus(args.synthetic, vector_store.embedding_dim)
+        print(f"Corpus: {len(vectors)} synthetic vectors")
+
+    # Queries are perturbed corpus vectors, so each has a meaningful neighbourhood
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(queries.shape[1])
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    faiss.normalize_L2(queries)
+
+    ids = np.arange(len(vectors), dtype=np.int64)
+    documents = ChunkStore.from_items(((i, {"text": ""}) for i in ids.tolist()), vectors)
+    exact_index = faiss.IndexFlatIP(vectors.shape[1])
+    exact_index.add(vectors)
+    _, truth = exact_index.search(queries, args.k)
+
+    original_type = vector_store.index_type
+    rows = []
+    try:
+        for index_type in INDEX_TYPES:
+            vector_store.index_type = index_type
+            start = time.perf_counter()
+            snapshot = IndexSnapshot(vector_store._build_id_index(vectors, ids), documents, len(ids))
+            build_seconds = time.perf_counter() - start
+            bytes_per_chunk = len(faiss.serialize_index(snapshot.index)) / len(ids)
+
+            modes = [False, True] if snapshot.is_compressed() else [False]
+            for rerank in modes:
+                start = time.perf_counter()
+                _, found = vector_store._search_vectors(snapshot, queries, args.k, rerank=rerank)
+                query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+                rows.append((index_type + (" +rerank" if rerank else ""), bytes_per_chunk,
+                             recall_at_k(found, truth), build_seconds, query_ms))
+    finally:
+        vector_store.index_type = original_type
+
+    exact_bytes = vectors.shape[1] * 4
+    print(f"\nExact vectors for re-ranking: {exact_bytes} B/chunk on disk (memory-mapped, not resident)")
+    print(f"{'index':<14}{'B/chunk':>10}{'recall@' + str(args.k):>12}{'build s':>10}{'ms/query':>10}")
+    for name, bytes_per_chunk, recall, build_seconds, query_ms in rows:
+        print(f"{name:<14}{bytes_per_chunk:>10.1f}{recall:>12.3f}{build_seconds:>10.2f}{query_ms:>10.3f}")
+
+if __name__ == "__main__":
+    main()
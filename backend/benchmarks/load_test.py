@@ -0,0 +1,128 @@
+"""Concurrent /process-email load test: do requests overlap or serialize?
+
+Sends --requests emails with at most --concurrency in flight, while probing
+/health, and reports wall time, request latencies and the overlap factor
+(sum of latencies / wall time: ~1 when requests serialize, up to the
+concurrency when they overlap). Without --url the API runs in-process and
+Gemini is simulated: each LLM call takes --llm-delay seconds, the fast
+path prompt is answered directly and, with FAST_PATH_MODE=off, the first
+agent step calls PolicySearch and the second returns the final answer.
+Run from the backend directory:
+
+    python -m benchmarks.load_test --requests 16 --concurrency 8 --llm-delay 1.0
+    python -m benchmarks.load_test --url http://localhost:8000 --requests 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import numpy as np
+import httpx
+
+FINAL_ANSWER = json.dumps({
+    "draft_reply": "Subject: Re: Leave\n\nDear Employee,\n\nPlease see the leave policy.\n\nBest regards,\nHR Department",
+    "category": "policy_query", "department": "HR Department", "confidence": 0.9, "escalate": False
+})
+
+def simulated_gemini(delay: float):
+    """A chat model class standing in for ChatGoogleGenerativeAI with a fixed latency"""
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    class SimulatedGemini(BaseChatModel):
+        delay: float = 1.0
+
+        @property
+        def _llm_type(self) -> str:
+            return "simulated-gemini"
+
+        def _reply(self, messages) -> ChatResult:
+            prompt = messages[-1].content
+            scratchpad = prompt.split("Begin!")[-1]
+            if "Begin!" not in prompt:
+                text = FINAL_ANSWER  # Fast path: one grounded call
+            elif "Observation:" in scratchpad:
+                text = f"Thought: I now have the information needed\nFinal Answer: {FINAL_ANSWER}"
+            else:
+                text = "Thought: I should search the policies\nAction: PolicySearch\nAction Input: leave policy"
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            time.sleep(self.delay)
+            return self._reply(messages)
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            await asyncio.sleep(self.delay)
+            return self._reply(messages)
+
+    return lambda **kwargs: SimulatedGemini(delay=delay, cache=kwargs.get("cache"))
+
+def in_process_client(llm_delay: float) -> httpx.AsyncClient:
+    # Unique emails anyway, but keep caches from short-circuiting any of them
+    os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+    os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+    import src.agent.email_agent as email_agent
+    email_agent.ChatGoogleGenerativeAI = simulated_gemini(llm_delay)
+    email_agent.get_email_agent().agent_executor.verbose = False
+    from src.main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load-test", timeout=None)
+
+async def run(client: httpx.AsyncClient, requests: int, concurrency: int):
+    slots = asyncio.Semaphore(concurrency)
+    latencies, statuses, health = [], [], []
+    done = asyncio.Event()
+
+    async def send(i: int):
+        async with slots:
+            start = time.perf_counter()
+            response = await client.post("/process-email", json={
+                "subject": f"Leave question {i}",
+                "body": f"Hello, how many days of annual leave do I get in year {i}?",
+                "sender": f"employee{i}@company.com"
+            })
+            latencies.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get("/health")
+            health.append(time.perf_counter() - start)
+            await asyncio.sleep(0.05)
+
+    prober = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(send(i) for i in range(requests)))
+    wall = time.perf_counter() - start
+    done.set()
+    await prober
+    return wall, latencies, statuses, health
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Base URL of a running API (default: in-process with simulated Gemini)")
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--llm-delay", type=float, default=1.0, help="Seconds per simulated LLM call")
+    args = parser.parse_args()
+
+    async def go():
+        client = (httpx.AsyncClient(base_url=args.url, timeout=None) if args.url
+                  else in_process_client(args.llm_delay))
+        async with client:
+            return await run(client, args.requests, args.concurrency)
+
+    wall, latencies, statuses, health = asyncio.run(go())
+    p50, p95 = np.percentile(latencies, [50, 95])
+    print(f"{args.requests} requests, {args.concurrency} in flight, "
+          f"statuses {dict(zip(*np.unique(statuses, return_counts=True)))}")
+    print(f"wall {wall:.2f}s   latency p50 {p50:.2f}s p95 {p95:.2f}s   "
+          f"overlap {sum(latencies) / wall:.1f}x (1.0x = serialized)")
+    if health:
+        print(f"/health during load: {len(health)} probes, p50 {np.median(health) * 1000:.1f} ms, "
+              f"max {max(health) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
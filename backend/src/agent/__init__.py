@@ -1,3 +1,3 @@
-from src.agent.email_agent import process_email, EmailAssistantAgent, get_email_agent
+from src.agent.email_agent import process_email, aprocess_email, EmailAssistantAgent, get_email_agent
 
-__all__ = ['process_email', 'EmailAssistantAgent', 'get_email_agent']
\ No newline at end of file
+__all__ = ['process_email', 'aprocess_email', 'EmailAssistantAgent', 'get_email_agent']
\ No newline at end of file
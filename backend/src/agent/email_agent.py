@@ -1,23 +1,102 @@
 from langchain.agents import create_react_agent, AgentExecutor
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
-from src.config import GOOGLE_API_KEY, GEMINI_MODEL, AGENT_TEMPERATURE, MAX_ITERATIONS
-from src.agent.tools import tools
+from langchain_core.callbacks import BaseCallbackHandler
+from src.config import (
+    GOOGLE_API_KEY, GEMINI_MODEL, AGENT_TEMPERATURE, MAX_ITERATIONS, STRUCTURED_OUTPUT,
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MIN_CONFIDENCE, LLM_CACHE_ENABLED,
+    FAST_PATH_MODE, FAST_PATH_MIN_SIMILARITY, SEARCH_MODE
+)
+from src.agent.tools import (
+    tools, run_in_search_executor, search_policies, format_search_results, find_sensitive_keyword
+)
+from src.agent.response_cache import ResponseCache
+from src.agent.llm_cache import SQLiteLLMCache, call_site, current_hit_tally
+from src.ingestion import namespaces
+from src.ingestion.namespaces import current_namespace
 from src.models import EmailResponse, EmailCategory
+import asyncio
 import json
 import re
-from typing import Optional
+from typing import Optional, Dict, Any
 
+TEXT_FINAL_ANSWER = """Final Answer: A complete, professional email reply that:
+- Starts with "Subject: Re: [topic]"
+- Uses the sender's name in the greeting (e.g., "Dear John" not "Dear john.doe@company.com")
+- Addresses all parts of the question
+- Uses information from policy documents when available
+- Is friendly and professional
+- Ends with an appropriate signature based on the recipient department
+- Ends with an offer to help further"""
+
+JSON_ANSWER_FORMAT = """ONLY a JSON object, with no other text, of the form
+{"draft_reply": "...", "category": "...", "department": "...", "confidence": 0.0, "escalate": false}
+where:
+- draft_reply is a complete, professional email reply that starts with "Subject: Re: [topic]", uses the sender's name in the greeting (e.g., "Dear John" not "Dear john.doe@company.com"), addresses all parts of the question using information from policy documents when available, is friendly and professional, ends with an offer to help further and is signed by the department
+- category is one of: """ + ", ".join(f'"{category.value}"' for category in EmailCategory) + """
+- department is the department that should sign the reply (e.g., "HR Department", "Finance Team", "IT Support", "Benefits Team", "Office Assistant")
+- confidence is a number from 0 to 1: how well the policy documents support the reply
+- escalate is true if a human should review the reply before it is sent (sensitive, legal or unresolved matters)"""
+
+STRUCTURED_FINAL_ANSWER = "Final Answer: " + JSON_ANSWER_FORMAT
+
+# One grounded call for the fast path: the passages are retrieved up front, so no tool list
+FAST_PATH_PROMPT = """You are an Intelligent Office Email Assistant. Answer the email below using the company policy documents retrieved for it.
+
+IMPORTANT GUIDELINES:
+1. Base your answer only on the policy documents; do not invent policy details
+2. If the documents do not answer the question, politely explain that and suggest alternatives
+
+POLICY DOCUMENTS:
+{context}
+
+EMAIL:
+{email}
+
+Respond with {answer_format}"""
+
+FAST_PATH_MODES = ("off", "auto", "always")
+
+
+# Byte-identical prompts (retries, resubmits) are answered from disk instead of Gemini
+llm_cache: Optional[SQLiteLLMCache] = SQLiteLLMCache() if LLM_CACHE_ENABLED else None
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Counts LLM calls (agent steps and direct invokes) made while processing one email
+
+    Calls answered by the LLM cache are counted too; subtract its hits for round trips.
+    """
+
+    run_inline = True  # Count on the event loop rather than in an executor thread
 
-class EmailAssistantAgent:
     def __init__(self):
+        self.calls = 0
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.calls += 1
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.calls += 1
+
+
+class EmailAssistantAgent:
+    def __init__(self, structured_output: bool = STRUCTURED_OUTPUT, fast_path_mode: str = FAST_PATH_MODE):
+        if fast_path_mode not in FAST_PATH_MODES:
+            raise ValueError(f"Unknown fast path mode '{fast_path_mode}', expected one of {FAST_PATH_MODES}")
+        self.structured_output = structured_output
+        self.fast_path_mode = fast_path_mode
+        # Emails answered per path, and why the fast path handed emails to the agent
+        self.path_counts = {"fast_path": 0, "agent": 0}
+        self.fallbacks = {"sensitive": 0, "low_confidence": 0}
         # Initialize Gemini
         self.llm = ChatGoogleGenerativeAI(
             model=GEMINI_MODEL,
             google_api_key=GOOGLE_API_KEY,
             temperature=AGENT_TEMPERATURE,
             convert_system_message_to_human=True,
-            max_output_tokens=2048
+            max_output_tokens=2048,
+            cache=llm_cache  # Covers both the ReAct executor and the direct invokes below
         )
 
         # Create the prompt template with clearer instructions
@@ -42,20 +121,13 @@ Action Input: the input to the action
 Observation: the result of the action
 
 Thought: I now have the information needed
-Final Answer: A complete, professional email reply that:
-- Starts with "Subject: Re: [topic]"
-- Uses the sender's name in the greeting (e.g., "Dear John" not "Dear john.doe@company.com")
-- Addresses all parts of the question
-- Uses information from policy documents when available
-- Is friendly and professional
-- Ends with an appropriate signature based on the recipient department
-- Ends with an offer to help further
+{final_answer}
 
 Begin!
 
 Question: {input}
 Thought: {agent_scratchpad}"""
-        )
+        ).partial(final_answer=STRUCTURED_FINAL_ANSWER if structured_output else TEXT_FINAL_ANSWER)
 
         # Create agent
         self.agent = create_react_agent(
@@ -72,7 +144,9 @@ Thought: {agent_scratchpad}"""
             handle_parsing_errors=True,
             max_iterations=MAX_ITERATIONS,
             early_stopping_method="generate",
-            return_intermediate_steps=True
+            return_intermediate_steps=True,
+            # Streamed LLM calls bypass LangChain's cache, so invoke the agent's LLM plainly
+            stream_runnable=llm_cache is None
         )
 
     def extract_sender_info(self, email_content: str) -> tuple:
@@ -132,7 +206,8 @@ Thought: {agent_scratchpad}"""
             return subject_match.group(1).strip()
         return "Your Inquiry"
 
-    def determine_department_from_content(self, email_content: str, retrieved_docs: list, recipient_info: tuple) -> str:
+    async def adetermine_department_from_content(self, email_content: str, retrieved_docs: list, recipient_info: tuple,
+                                                 callbacks: Optional[list] = None) -> str:
         """Use LLM to determine the appropriate department based on content, retrieved docs, and recipient"""
         
         recipient_name, recipient_email = recipient_info
@@ -167,7 +242,7 @@ The department name should be professional and appropriate for the context.
 Department:"""
         
         try:
-            response = self.llm.invoke(prompt).content.strip()
+            response = (await self.llm.ainvoke(prompt, config={"callbacks": callbacks})).content.strip()
             # Clean up the response
             response = re.sub(r'^["\']|["\']$', '', response)  # Remove quotes
             return response
@@ -175,7 +250,23 @@ Department:"""
             return "Office Assistant"
 
     def process_email(self, email_content: str) -> EmailResponse:
-        """Process an email and generate response"""
+        """Process an email and generate response (blocking; see aprocess_email)"""
+        return asyncio.run(self.aprocess_email(email_content))
+
+    async def aprocess_email(self, email_content: str) -> EmailResponse:
+        """Process an email and generate response without blocking the event loop
+
+        LLM calls are awaited and PolicySearch runs in the bounded search executor.
+        In structured output mode the agent's final answer also carries the
+        category, signing department, confidence and escalation flag, so no
+        further LLM call is made unless that JSON cannot be parsed.
+
+        Unless fast_path_mode is "off", the email is first tried on the fast
+        path (see _afast_path), and the agent only runs if that declines it.
+        """
+        counter = LLMCallCounter()
+        cache_hits = {"hits": 0}
+        tally_token = current_hit_tally.set(cache_hits)
         try:
             # Extract sender and recipient information
             sender_name, sender_email = self.extract_sender_info(email_content)
@@ -194,39 +285,21 @@ ADDITIONAL CONTEXT FOR YOUR RESPONSE:
 Please address the sender as "{sender_name}" in your greeting.
 """
             
-            # Run the agent with enhanced input
-            result = self.agent_executor.invoke({
-                "input": enhanced_input
-            })
-            
-            # Extract retrieved docs from intermediate steps
-            retrieved_docs = []
-            if "intermediate_steps" in result:
-                for step in result["intermediate_steps"]:
-                    action, observation = step
-                    if action.tool == "PolicySearch" and observation:
-                        retrieved_docs.append({
-                            "tool": "PolicySearch",
-                            "result": observation[:300]
-                        })
-            
-            # Determine the appropriate department for signature
-            department = self.determine_department_from_content(
-                email_content, 
-                retrieved_docs, 
-                (recipient_name, recipient_email)
-            )
+            response = None
+            if self.fast_path_mode != "off":
+                response = await self._afast_path(email_content, enhanced_input, subject,
+                                                  (recipient_name, recipient_email), counter)
+            if response is None:
+                response = await self._arun_agent(email_content, enhanced_input, sender_name,
+                                                  (recipient_name, recipient_email), counter)
+                response.processing_path = "agent"
+                self.path_counts["agent"] += 1
             
-            # Check if we have a valid output
-            if "output" in result and result["output"]:
-                response = self._parse_response(result["output"])
-                # Ensure the signature is appropriate
-                response.draft_reply = self._ensure_proper_signature(response.draft_reply, department)
-                response.retrieved_docs = retrieved_docs
-                return response
-            else:
-                # If no output, generate a response from the intermediate steps
-                return self._generate_response_from_steps(retrieved_docs, enhanced_input, department, sender_name)
+            response.llm_calls = counter.calls - cache_hits["hits"]
+            response.llm_cache_hits = cache_hits["hits"]
+            print(f"🤖 Email processed with {response.llm_calls} LLM calls"
+                  + (f" ({cache_hits['hits']} more answered from cache)" if cache_hits["hits"] else ""))
+            return response
 
         except Exception as e:
             error_str = str(e).lower()
@@ -239,13 +312,120 @@ Please address the sender as "{sender_name}" in your greeting.
                     confidence_score=0.3,
                     requires_human_review=True,
                     clarification_needed=False,
-                    clarification_question=None
+                    clarification_question=None,
+                    llm_calls=counter.calls - cache_hits["hits"],
+                    llm_cache_hits=cache_hits["hits"]
                 )
             else:
                 print(f"Agent error: {e}")
-                return self._get_fallback_response()
+                response = self._get_fallback_response()
+                response.llm_calls = counter.calls - cache_hits["hits"]
+                response.llm_cache_hits = cache_hits["hits"]
+                return response
+        finally:
+            current_hit_tally.reset(tally_token)
+
+    async def _afast_path(self, email_content: str, enhanced_input: str, subject: str,
+                          recipient_info: tuple, counter: "LLMCallCounter") -> Optional[EmailResponse]:
+        """Answer with one search on the email and one grounded LLM call
+
+        Returns None, leaving the email to the agent, when it contains a
+        sensitive keyword or (in "auto" mode) when the best passage is below
+        FAST_PATH_MIN_SIMILARITY.
+        """
+        keyword = find_sensitive_keyword(email_content)
+        if keyword:
+            print(f"🛂 Fast path declined: sensitive keyword '{keyword}'")
+            self.fallbacks["sensitive"] += 1
+            return None
+        
+        # Search on the subject and body; "|" would be read as the start of search filters
+        body = email_content.split("\n\n", 1)[-1]
+        query = f"{subject}\n{body}".replace("|", " ")
+        results = await run_in_search_executor(search_policies, query)
+        top_similarity = max((float(result["similarity_score"]) for result in results), default=0.0)
+        # BM25 scores are unbounded, so in lexical mode only an empty result is low confidence
+        confident = bool(results) and (SEARCH_MODE == "lexical" or top_similarity >= FAST_PATH_MIN_SIMILARITY)
+        if self.fast_path_mode == "auto" and not confident:
+            print(f"🛂 Fast path declined: top similarity {top_similarity:.2f}")
+            self.fallbacks["low_confidence"] += 1
+            return None
+        
+        context = format_search_results(results)
+        prompt = FAST_PATH_PROMPT.format(context=context, email=enhanced_input, answer_format=JSON_ANSWER_FORMAT)
+        with call_site("fast_path"):
+            text = (await self.llm.ainvoke(prompt, config={"callbacks": [counter]})).content
+        
+        structured = self._parse_structured_output(text)
+        if structured:
+            response = self._parse_response(structured["draft_reply"], structured)
+            department = structured["department"]
+        else:
+            response = self._parse_response(text)
+            with call_site("department"):
+                department = await self.adetermine_department_from_content(
+                    email_content, [{"tool": "PolicySearch", "result": context}], recipient_info,
+                    callbacks=[counter]
+                )
+        response.draft_reply = self._ensure_proper_signature(response.draft_reply, department)
+        response.retrieved_docs = [{"tool": "PolicySearch", "result": context[:300]}] if results else []
+        response.processing_path = "fast_path"
+        self.path_counts["fast_path"] += 1
+        return response
+
+    async def _arun_agent(self, email_content: str, enhanced_input: str, sender_name: str,
+                          recipient_info: tuple, counter: "LLMCallCounter") -> EmailResponse:
+        """The full ReAct loop: the agent decides which tools to call before answering"""
+        recipient_name, recipient_email = recipient_info
+        # Run the agent with enhanced input
+        result = await self.agent_executor.ainvoke({
+            "input": enhanced_input
+        }, config={"callbacks": [counter]})
+
+        # Extract retrieved docs from intermediate steps
+        retrieved_docs = []
+        if "intermediate_steps" in result:
+            for step in result["intermediate_steps"]:
+                action, observation = step
+                if action.tool == "PolicySearch" and observation:
+                    retrieved_docs.append({
+                        "tool": "PolicySearch",
+                        "result": observation[:300]
+                    })
+
+        structured = None
+        if self.structured_output and result.get("output"):
+            structured = self._parse_structured_output(result["output"])
+
+        if structured:
+            # The final answer already names the department: no extra round trip
+            response = self._parse_response(structured["draft_reply"], structured)
+            response.draft_reply = self._ensure_proper_signature(response.draft_reply, structured["department"])
+            response.retrieved_docs = retrieved_docs
+        else:
+            # Determine the appropriate department for signature
+            with call_site("department"):
+                department = await self.adetermine_department_from_content(
+                    email_content, 
+                    retrieved_docs, 
+                    (recipient_name, recipient_email),
+                    callbacks=[counter]
+                )
 
-    def _generate_response_from_steps(self, retrieved_docs, original_query, department, sender_name):
+            # Check if we have a valid output
+            if "output" in result and result["output"]:
+                response = self._parse_response(result["output"])
+                # Ensure the signature is appropriate
+                response.draft_reply = self._ensure_proper_signature(response.draft_reply, department)
+                response.retrieved_docs = retrieved_docs
+            else:
+                # If no output, generate a response from the intermediate steps
+                with call_site("steps_fallback"):
+                    response = await self._agenerate_response_from_steps(retrieved_docs, enhanced_input, department,
+                                                                         sender_name, callbacks=[counter])
+        return response
+
+    async def _agenerate_response_from_steps(self, retrieved_docs, original_query, department, sender_name, callbacks=None):
         """Generate a response from intermediate steps if final output is missing"""
         try:
             # Extract information from steps
@@ -271,7 +451,7 @@ Generate a professional email reply that:
 
 Email reply:"""
                 
-                response = self.llm.invoke(prompt).content
+                response = (await self.llm.ainvoke(prompt, config={"callbacks": callbacks})).content
                 parsed = self._parse_response(response)
                 parsed.retrieved_docs = retrieved_docs
                 return parsed
@@ -310,8 +490,38 @@ Email reply:"""
         
         return draft_reply
 
-    def _parse_response(self, response_text: str) -> EmailResponse:
-        """Parse the agent's response into EmailResponse"""
+    def _parse_structured_output(self, output: str) -> Optional[Dict[str, Any]]:
+        """Extract the JSON final answer of structured output mode (None if malformed)"""
+        if "Final Answer:" in output:
+            output = output.split("Final Answer:")[-1]
+        start, end = output.find("{"), output.rfind("}")
+        if start < 0 or end < start:
+            return None
+        try:
+            data = json.loads(output[start:end + 1])
+        except ValueError:
+            return None
+        if not isinstance(data, dict) or not str(data.get("draft_reply") or "").strip():
+            return None
+        try:
+            confidence = min(max(float(data.get("confidence", 0.85)), 0.0), 1.0)
+        except (TypeError, ValueError):
+            confidence = 0.85
+        escalate = data.get("escalate", False)
+        return {
+            "draft_reply": str(data["draft_reply"]).strip(),
+            "category": str(data.get("category") or "").strip().lower(),
+            "department": str(data.get("department") or "").strip() or "Office Assistant",
+            "confidence": confidence,
+            "escalate": escalate is True or str(escalate).lower() == "true"
+        }
+
+    def _parse_response(self, response_text: str, structured: Optional[Dict[str, Any]] = None) -> EmailResponse:
+        """Parse the agent's response into EmailResponse
+
+        structured, if given, is the parsed JSON final answer: its category,
+        confidence and escalation flag are used instead of keyword guesses.
+        """
         try:
             # Extract the actual email content
             if "Final Answer:" in response_text:
@@ -352,14 +562,17 @@ Email reply:"""
                 if "policy" in draft.lower() or "sick" in draft.lower() or "leave" in draft.lower()
                 else EmailCategory.GENERAL_INQUIRY
             )
+            if structured and structured["category"] in {c.value for c in EmailCategory}:
+                category = EmailCategory(structured["category"])
+            escalate = bool(structured and structured["escalate"]) or category == EmailCategory.HUMAN_ESCALATION
 
             return EmailResponse(
                 draft_reply=draft,
                 category=category,
                 retrieved_docs=[],
-                confidence_score=0.85,
-                requires_human_review=False,
-                clarification_needed=False,
+                confidence_score=structured["confidence"] if structured else 0.85,
+                requires_human_review=escalate,
+                clarification_needed=category == EmailCategory.CLARIFICATION_NEEDED,
                 clarification_question=None
             )
 
@@ -382,6 +595,8 @@ Email reply:"""
 
 # Global instance
 _email_agent_instance: Optional[EmailAssistantAgent] = None
+# Replies to answered emails, reused for semantically equivalent ones
+response_cache = ResponseCache()
 
 
 def get_email_agent() -> EmailAssistantAgent:
@@ -392,10 +607,77 @@ def get_email_agent() -> EmailAssistantAgent:
     return _email_agent_instance
 
 
-def process_email(email_content: str) -> EmailResponse:
-    """Process an email and generate a response"""
-    agent = get_email_agent()
-    return agent.process_email(email_content)
+def _is_cacheable(response: EmailResponse) -> bool:
+    """Only confident, self-contained answers are reused for other senders"""
+    return (not response.requires_human_review and not response.clarification_needed
+            and response.category not in (EmailCategory.SENSITIVE_MATTER, EmailCategory.HUMAN_ESCALATION)
+            and response.confidence_score >= RESPONSE_CACHE_MIN_CONFIDENCE)
+
+
+def process_email(email_content: str, namespace: Optional[str] = None) -> EmailResponse:
+    """Process an email and generate a response (blocking; see aprocess_email)"""
+    return asyncio.run(aprocess_email(email_content, namespace))
+
 
+async def aprocess_email(email_content: str, namespace: Optional[str] = None) -> EmailResponse:
+    """Process an email and generate a response
 
-__all__ = ['process_email', 'EmailAssistantAgent', 'get_email_agent']
\ No newline at end of file
+    PolicySearch calls made while processing search the given namespace's documents.
+    With RESPONSE_CACHE_ENABLED, an email semantically equivalent to one already
+    answered against the same index version reuses that reply (re-addressed to
+    the new sender) without running the agent.
+    """
+    agent = get_email_agent()
+    token = current_namespace.set(namespace) if namespace else None
+    try:
+        if not RESPONSE_CACHE_ENABLED:
+            return await agent.aprocess_email(email_content)
+        
+        name = current_namespace.get()
+        store = await run_in_search_executor(namespaces.get, name)  # May load the namespace from disk
+        version = store.version
+        sender_name, _ = agent.extract_sender_info(email_content)
+        subject = agent.extract_subject(email_content)
+        body = email_content.split("\n\n", 1)[-1]
+        embedding = await run_in_search_executor(response_cache.embed, store, subject, body)
+        cached = response_cache.get(name, store, embedding)
+        if cached is not None:
+            response, cached_sender, similarity = cached
+            print(f"♻️ Reusing cached reply (similarity {similarity:.3f})")
+            return EmailResponse(**{
+                **response,
+                "draft_reply": ResponseCache.personalize(response["draft_reply"], cached_sender, sender_name, subject),
+                "llm_calls": 0,
+                "processing_path": "response_cache",
+                "cache_hit": True,
+                "cache_similarity": round(similarity, 4)
+            })
+        
+        response = await agent.aprocess_email(email_content)
+        if _is_cacheable(response):
+            response_cache.put(name, store, version, embedding, sender_name,
+                               response.model_dump(exclude={"llm_calls", "llm_cache_hits", "processing_path",
+                                                           "cache_hit", "cache_similarity"}))
+        return response
+    finally:
+        if token is not None:
+            current_namespace.reset(token)
+
+
+def email_path_stats() -> Dict[str, Any]:
+    """Emails answered per path (response cache, fast path, agent) since startup, and their shares"""
+    agent = _email_agent_instance
+    counts = {"response_cache": response_cache.hits,
+              **(agent.path_counts if agent else {"fast_path": 0, "agent": 0})}
+    total = sum(counts.values())
+    return {
+        "fast_path_mode": agent.fast_path_mode if agent else FAST_PATH_MODE,
+        "emails": total,
+        "counts": counts,
+        "shares": {path: round(count / total, 4) if total else 0.0 for path, count in counts.items()},
+        "fast_path_fallbacks": dict(agent.fallbacks) if agent else {"sensitive": 0, "low_confidence": 0}
+    }
+
+
+__all__ = ['process_email', 'aprocess_email', 'EmailAssistantAgent', 'get_email_agent', 'email_path_stats',
+           'response_cache', 'llm_cache']
\ No newline at end of file
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+from src.config import LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES
+
+# Name of the code path making LLM calls, for per-call-site hit metrics
+current_call_site: ContextVar[str] = ContextVar("llm_call_site", default="agent")
+# Per-request tally of cache hits ({"hits": n}), if the caller wants one
+current_hit_tally: ContextVar[Optional[Dict[str, int]]] = ContextVar("llm_hit_tally", default=None)
+
+@contextmanager
+def call_site(name: str) -> Iterator[None]:
+    """Attribute LLM calls made inside the block to a call site"""
+    token = current_call_site.set(name)
+    try:
+        yield
+    finally:
+        current_call_site.reset(token)
+
+class SQLiteLLMCache(BaseCache):
+    """Exact-match LLM response cache in a SQLite file, with TTL and LRU eviction
+
+    Keys are SHA-256 hashes of the serialized model configuration (LangChain's
+    llm_string: model, temperature, stop words, ...) and prompt. Entries older
+    than ttl_seconds are ignored and deleted; past max_entries the least
+    recently used tenth is evicted.
+    """
+
+    EVICT_FRACTION = 0.1
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+        self._conn.commit()
+        self.sites: Dict[str, Dict[str, int]] = {}
+        self.expired = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _count(self, outcome: str):
+        site = self.sites.setdefault(current_call_site.get(), {"hits": 0, "misses": 0})
+        site[outcome] += 1
+        tally = current_hit_tally.get()
+        if tally is not None and outcome == "hits":
+            tally["hits"] = tally.get("hits", 0) + 1
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.expired += 1
+                row = None
+            if row is None:
+                self._count("misses")
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._count("hits")
+        return [loads(generation) for generation in json.loads(row[0])]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        value = json.dumps([dumps(generation) for generation in return_val])
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created, last_used) VALUES (?, ?, ?, ?)",
+                (self._key(prompt, llm_string), value, now, now)
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            if count > self.max_entries:
+                evict = count - self.max_entries + int(self.max_entries * self.EVICT_FRACTION)
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used LIMIT ?)",
+                    (evict,)
+                )
+                self.evictions += evict
+            self._conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        hits = sum(site["hits"] for site in self.sites.values())
+        lookups = hits + sum(site["misses"] for site in self.sites.values())
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": hits,
+            "misses": lookups - hits,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "call_sites": {
+                name: {**site, "hit_rate": site["hits"] / (site["hits"] + site["misses"])}
+                for name, site in self.sites.items()
+            }
+        }
@@ -0,0 +1,122 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import faiss
+import numpy as np
+from src.config import RESPONSE_CACHE_THRESHOLD, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS
+
+GREETING_PATTERN = re.compile(r"^(\s*(?:Dear|Hi|Hello|Hey|Good (?:morning|afternoon|evening)))\b[^,\n]*", re.IGNORECASE | re.MULTILINE)
+SUBJECT_PREFIX_PATTERN = re.compile(r"^\s*((?:re|fw|fwd)\s*:\s*)+", re.IGNORECASE)
+
+class _NamespaceEntries:
+    """Answered emails of one namespace: a flat inner-product index plus the responses by ID"""
+
+    def __init__(self, dim: int, version: Optional[str]):
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self.version = version
+        self.entries: "OrderedDict[int, tuple]" = OrderedDict()  # ID -> (time, sender name, response dict)
+        self.next_id = 0
+
+class ResponseCache:
+    """Semantic cache of email responses, looked up by embedding similarity
+
+    Emails are embedded (normalized subject + body) with the namespace's
+    vector store encoder; a lookup returns the most similar answered email
+    of that namespace if its cosine similarity reaches the threshold. Each
+    namespace's entries are tagged with the vector store version their
+    answers were drafted against and dropped when it changes.
+    """
+
+    def __init__(self, threshold: float = RESPONSE_CACHE_THRESHOLD, max_size: int = RESPONSE_CACHE_SIZE,
+                 ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._namespaces: Dict[str, _NamespaceEntries] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize(subject: str, body: str) -> str:
+        """Subject without Re:/Fwd: prefixes plus body, lowercased with whitespace collapsed"""
+        text = f"{SUBJECT_PREFIX_PATTERN.sub('', subject)}\n{body}"
+        return re.sub(r"\s+", " ", text.lower()).strip()
+
+    @staticmethod
+    def personalize(draft: str, cached_name: str, sender_name: str, subject: str) -> str:
+        """Re-address a cached draft: subject line, greeting and mentions of the original sender"""
+        lines = draft.split("\n")
+        if lines and lines[0].startswith("Subject:"):
+            lines[0] = f"Subject: Re: {SUBJECT_PREFIX_PATTERN.sub('', subject).strip()}"
+        draft = "\n".join(lines)
+        if cached_name and cached_name.lower() != "there":
+            draft = re.sub(rf"\b{re.escape(cached_name)}\b", sender_name, draft)
+        return GREETING_PATTERN.sub(lambda match: f"{match.group(1)} {sender_name}", draft, count=1)
+
+    def _entries(self, namespace: str, store) -> _NamespaceEntries:
+        entries = self._namespaces.get(namespace)
+        if entries is not None and entries.version != store.version:
+            if entries.entries:
+                self.invalidations += 1
+            entries = None
+        if entries is None:
+            entries = self._namespaces[namespace] = _NamespaceEntries(store.embedding_dim, store.version)
+        return entries
+
+    def embed(self, store, subject: str, body: str) -> np.ndarray:
+        # Bypass the persistent embedding cache: emails are not corpus text
+        return store.create_embeddings([self.normalize(subject, body)], use_cache=False)
+
+    def get(self, namespace: str, store, embedding: np.ndarray) -> Optional[Tuple[Dict[str, Any], str, float]]:
+        """(cached response dict, sender name it addressed, similarity) or None"""
+        with self._lock:
+            entries = self._entries(namespace, store)
+            if entries.index.ntotal:
+                scores, ids = entries.index.search(embedding, 1)
+                doc_id, score = int(ids[0, 0]), float(scores[0, 0])
+                entry = entries.entries.get(doc_id)
+                if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                    entries.index.remove_ids(np.array([doc_id], dtype=np.int64))
+                    del entries.entries[doc_id]
+                elif entry is not None and score >= self.threshold:
+                    entries.entries.move_to_end(doc_id)
+                    self.hits += 1
+                    return entry[2], entry[1], score
+            self.misses += 1
+            return None
+
+    def put(self, namespace: str, store, version: Optional[str], embedding: np.ndarray,
+            sender_name: str, response: Dict[str, Any]):
+        """Cache a response drafted against index version (skipped if the index changed meanwhile)"""
+        with self._lock:
+            if store.version != version:
+                return
+            entries = self._entries(namespace, store)
+            doc_id, entries.next_id = entries.next_id, entries.next_id + 1
+            entries.index.add_with_ids(embedding, np.array([doc_id], dtype=np.int64))
+            entries.entries[doc_id] = (time.monotonic(), sender_name, response)
+            while len(entries.entries) > self.max_size:
+                evicted, _ = entries.entries.popitem(last=False)
+                entries.index.remove_ids(np.array([evicted], dtype=np.int64))
+
+    def clear(self):
+        with self._lock:
+            self._namespaces.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": sum(len(entries.entries) for entries in self._namespaces.values()),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "index_versions": {name: entries.version for name, entries in self._namespaces.items()},
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
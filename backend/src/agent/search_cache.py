@@ -0,0 +1,79 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+from src.config import SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_SECONDS, DEFAULT_NAMESPACE
+
+class SearchCache:
+    """LRU + TTL cache of similarity_search results, keyed by namespace, normalized query and k
+
+    Each namespace's entries are tagged with the vector store version they were
+    computed against; when a lookup sees a new version, that namespace's
+    entries are dropped.
+    """
+
+    def __init__(self, max_size: int = SEARCH_CACHE_SIZE, ttl_seconds: float = SEARCH_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._versions: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Lowercase, collapse whitespace and drop surrounding punctuation"""
+        return re.sub(r"\s+", " ", query.lower()).strip(" \t\n\"'.,;:!?")
+
+    def _check_version(self, namespace: str, version: Optional[str]):
+        if namespace in self._versions and self._versions[namespace] != version:
+            stale = [key for key in self._entries if key[0] == namespace]
+            if stale:
+                self.invalidations += 1
+            for key in stale:
+                del self._entries[key]
+        self._versions[namespace] = version
+
+    def get(self, query: str, k: int, version: Optional[str],
+            namespace: str = DEFAULT_NAMESPACE) -> Optional[List[Dict[str, Any]]]:
+        key = (namespace, self.normalize(query), k)
+        with self._lock:
+            self._check_version(namespace, version)
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, query: str, k: int, version: Optional[str], results: List[Dict[str, Any]],
+            namespace: str = DEFAULT_NAMESPACE):
+        key = (namespace, self.normalize(query), k)
+        with self._lock:
+            self._check_version(namespace, version)
+            self._entries[key] = (time.monotonic(), results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "index_versions": dict(self._versions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
@@ -1,32 +1,106 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from langchain.tools import tool
-from typing import Optional
-from src.ingestion import vector_store
+from typing import Any, Callable, Optional, Dict, List, Tuple
+from src.ingestion import namespaces
+from src.ingestion.namespaces import current_namespace
+from src.agent.search_cache import SearchCache
+from src.config import FILTER_FIELDS, DEFAULT_DEPARTMENT, SEARCH_WORKERS, MMR_ENABLED
 from src.models import EmailCategory
 
+SENSITIVE_KEYWORDS = [
+    "harassment", "discrimination", "complaint", "legal", "lawsuit",
+    "hr issue", "termination", "fire", "fired", "sexual", "harass",
+    "bullying", "unfair", "lawsuit", "attorney", "lawyer", "court"
+]
+
+# Shared result cache; a new index version invalidates it automatically
+search_cache = SearchCache()
+# Bounded pool for the CPU-bound work (query encoding, FAISS/BM25 search) of async requests
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+
+async def run_in_search_executor(func: Callable, *args: Any) -> Any:
+    """Run func off the event loop in the search executor, keeping the caller's
+    context variables (e.g. the current namespace)"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        search_executor, functools.partial(context.run, func, *args)
+    )
+
+def parse_search_filters(query: str) -> Tuple[str, Dict[str, List[str]]]:
+    """Split "question | department=hr; type=pdf,docx" into the question and its filters"""
+    question, _, filter_text = query.partition("|")
+    filters = {}
+    for clause in filter_text.split(";"):
+        field, _, values = clause.partition("=")
+        field = field.strip().lower()
+        if field in FILTER_FIELDS and values.strip():
+            filters[field] = [value.strip() for value in values.split(",") if value.strip()]
+    return question.strip(), filters
+
+def search_policies(query: str, k: int = 3) -> List[Dict[str, Any]]:
+    """Cached search of the current namespace, MMR-diversified if MMR_ENABLED (query may carry filters)"""
+    question, filters = parse_search_filters(query)
+    namespace = current_namespace.get()
+    store = namespaces.get(namespace)
+    version = store.version
+    results = search_cache.get(query, k, version, namespace)
+    if results is None:
+        results = store.similarity_search(question, k=k, filters=filters, mmr=MMR_ENABLED)
+        search_cache.put(query, k, version, results, namespace)
+    return results
+
+def excerpt(doc: Dict[str, Any], limit: int = 500) -> str:
+    """Up to limit characters of a passage (for token limits), from the matched chunk of a merged one"""
+    text = doc["text"]
+    start = max(0, min(doc["metadata"].get("match_start", 0), len(text) - limit))
+    return ("..." if start else "") + text[start:start + limit] + ("..." if start + limit < len(text) else "")
+
+def format_search_results(results: List[Dict[str, Any]]) -> str:
+    """Search results as cited passages for an LLM prompt"""
+    if not results:
+        return "No relevant policy documents found in the company database."
+    
+    formatted_results = []
+    for result in results:
+        doc = result["document"]
+        citation = doc["metadata"]["source"]
+        if doc["metadata"].get("page") is not None:
+            citation += f", Page: {doc['metadata']['page']}"
+        also_in = sorted({source["source"] for source in doc["metadata"].get("sources", [])[1:]}
+                         - {doc["metadata"]["source"]})
+        if also_in:
+            citation += f", Also in: {', '.join(also_in)}"
+        formatted_results.append(
+            f"[Document: {citation}, "
+            f"Department: {doc['metadata'].get('department', DEFAULT_DEPARTMENT)}, "
+            f"Relevance: {result['similarity_score']:.2f}]\n"
+            f"Content: {excerpt(doc)}"
+        )
+    
+    return "\n\n---\n\n".join(formatted_results)
+
+def find_sensitive_keyword(content: str) -> Optional[str]:
+    """The first HR/legal keyword in content that calls for human review, if any"""
+    content_lower = content.lower()
+    for keyword in SENSITIVE_KEYWORDS:
+        if keyword in content_lower:
+            return keyword
+    return None
+
 @tool
 def PolicySearch(query: str) -> str:
     """
     Search company policies, SOPs, and internal documents.
     Use this for any policy-related, rule-based, or procedure questions.
-    Input should be a specific question or search query.
+    Input should be a specific question or search query. To search only some
+    documents, append filters after a "|", e.g. "parental leave | department=hr"
+    (fields: department, source, type; separate several with ";").
     """
     try:
-        results = vector_store.similarity_search(query, k=3)
-        
-        if not results:
-            return "No relevant policy documents found in the company database."
-        
-        formatted_results = []
-        for result in results:
-            doc = result["document"]
-            formatted_results.append(
-                f"[Document: {doc['metadata']['source']}, "
-                f"Relevance: {result['similarity_score']:.2f}]\n"
-                f"Content: {doc['text'][:500]}..."  # Truncate for token limits
-            )
-        
-        return "\n\n---\n\n".join(formatted_results)
-    
+        return format_search_results(search_policies(query))
     except Exception as e:
         return f"Error searching policies: {str(e)}"
 
@@ -54,17 +128,16 @@ def CheckSensitivity(content: str) -> str:
     Check if email content contains sensitive information that requires escalation.
     Returns 'sensitive' if HR/legal issues detected, 'safe' otherwise.
     """
-    sensitive_keywords = [
-        "harassment", "discrimination", "complaint", "legal", "lawsuit",
-        "hr issue", "termination", "fire", "fired", "sexual", "harass",
-        "bullying", "unfair", "lawsuit", "attorney", "lawyer", "court"
-    ]
-    
-    content_lower = content.lower()
-    for keyword in sensitive_keywords:
-        if keyword in content_lower:
-            return f"sensitive - contains keyword: {keyword}"
+    keyword = find_sensitive_keyword(content)
+    if keyword:
+        return f"sensitive - contains keyword: {keyword}"
     
     return "safe"
 
+async def _apolicy_search(query: str) -> str:
+    return await run_in_search_executor(PolicySearch.func, query)
+
+# Used by the agent's ainvoke: searches run in the bounded executor, not LangChain's default one
+PolicySearch.coroutine = _apolicy_search
+
 tools = [PolicySearch, HumanEscalation, DraftEmail, CheckSensitivity]
\ No newline at end of file
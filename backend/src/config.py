@@ -9,16 +9,61 @@ GEMINI_MODEL = "gemini-2.5-flash"  # or "gemini-1.5-flash" for faster/cheaper
 
 # Embeddings Configuration
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Encoder backend: "torch" (SentenceTransformer, default) or "onnx" (int8-quantized ONNX Runtime on CPU).
+# The ONNX model is exported and quantized into ONNX_MODEL_DIR on first use.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "onnx_model")
+ONNX_NUM_THREADS = int(os.getenv("ONNX_NUM_THREADS", "4"))
+ONNX_PARITY_TOLERANCE = 0.99  # Minimum cosine similarity to the PyTorch embeddings
+
+# Vector Index Configuration
+# "flat" = exact search, "hnsw" = graph-based ANN, "ivf_flat" = inverted-file ANN,
+# "sq8" / "pq" = compressed codes (8-bit scalar / product quantization) with exact re-ranking
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+HNSW_M = 32                  # Graph neighbours per node
+HNSW_EF_CONSTRUCTION = 200   # Build-time search depth
+HNSW_EF_SEARCH = 64          # Default query-time search depth (overridable per query)
+IVF_NLIST = 1024             # Number of inverted lists (capped by corpus size)
+IVF_NPROBE = 16              # Default lists probed per query (overridable per query)
+PQ_M = 48                    # PQ sub-quantizers (bytes per vector); must divide the embedding dim
+PQ_NBITS = 8                 # Bits per PQ sub-quantizer code
+RERANK_FACTOR = 4            # Compressed indexes shortlist k * RERANK_FACTOR hits for exact re-ranking
+INDEX_TRAIN_SAMPLE = 40000   # Vectors buffered to train IVF/SQ8/PQ indexes during streaming ingestion
+# HNSW graphs can't delete vectors: removed chunks stay in the graph as tombstones that
+# searches skip, until they make up this share of it and the graph is rebuilt
+TOMBSTONE_COMPACT_FRACTION = 0.2
+
+# Retrieval Mode: "dense" (embeddings), "lexical" (BM25 only, skips the encoder)
+# or "hybrid" (both, fused with reciprocal rank fusion)
+SEARCH_MODE = os.getenv("SEARCH_MODE", "dense")
+HYBRID_CANDIDATES = 20       # Hits taken from each retriever before fusion
+RRF_K = 60                   # Reciprocal rank fusion constant
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Maximal Marginal Relevance (similarity_search(..., mmr=True); PolicySearch uses it when MMR_ENABLED)
+MMR_ENABLED = os.getenv("MMR_ENABLED", "false").lower() == "true"
+MMR_CANDIDATES = 20          # Hits fetched before diversifying down to k passages
+MMR_LAMBDA = 0.5             # 1.0 = pure relevance, 0.0 = pure diversity
+MMR_MAX_MERGED_CHUNKS = 2    # Most chunks (a pick and its direct neighbours) merged into one passage
+
+# Metadata Filters: chunk metadata fields that searches can filter on. Documents in a
+# subdirectory of DOCUMENTS_DIR get its (lowercased) name as their department.
+FILTER_FIELDS = ("source", "type", "department")
+DEFAULT_DEPARTMENT = "general"
+FILTER_BITMAP_MAX_VALUES = 64  # Fields with more values (e.g. source) keep ID lists, not bitmaps
 
 # Use Railway persistent volume in production
 if os.getenv("RAILWAY_VOLUME_MOUNT_PATH"):
     DATA_DIR = os.getenv("RAILWAY_VOLUME_MOUNT_PATH")
     DOCUMENTS_DIR = os.path.join(DATA_DIR, "documents")
     VECTOR_STORE_PATH = os.path.join(DATA_DIR, "faiss_index")
+    NAMESPACES_DIR = os.path.join(DATA_DIR, "namespaces")
 else:
     # Local development
     DOCUMENTS_DIR = "documents"
     VECTOR_STORE_PATH = "faiss_index"
+    NAMESPACES_DIR = "namespaces"
 
 # Create directories if they don't exist
 os.makedirs(DOCUMENTS_DIR, exist_ok=True)
@@ -27,10 +72,96 @@ vector_store_dir = os.path.dirname(VECTOR_STORE_PATH)
 if vector_store_dir:  # Only create if there's a directory path
     os.makedirs(vector_store_dir, exist_ok=True)
 
+# Namespaces (one corpus per business unit). The default namespace uses DOCUMENTS_DIR and
+# VECTOR_STORE_PATH; namespace "<name>" uses NAMESPACES_DIR/<name>/documents and .../faiss_index.
+# The default stays loaded; at most MAX_RESIDENT_NAMESPACES others are kept in memory (LRU).
+DEFAULT_NAMESPACE = "default"
+MAX_RESIDENT_NAMESPACES = int(os.getenv("MAX_RESIDENT_NAMESPACES", "8"))
+
+# Versioned index snapshots (index + chunks + manifest) live in f"{VECTOR_STORE_PATH}.snapshots";
+# the last few are kept for rollback
+SNAPSHOTS_TO_KEEP = 3
+
+# Tracks file hashes/mtimes and their chunk IDs for incremental re-ingestion.
+# Stored inside each snapshot; this path is only used by pre-snapshot stores.
+INGESTION_MANIFEST_PATH = f"{VECTOR_STORE_PATH}.manifest.json"
+
+# Embedding Cache Configuration (memory-mapped, keyed by model + text hash)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = f"{VECTOR_STORE_PATH}.embcache"
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000  # ~300 MB on disk for 384-dim vectors
+
+# PolicySearch Result Cache (entries are invalidated when the index version changes)
+SEARCH_CACHE_SIZE = 512
+SEARCH_CACHE_TTL_SECONDS = 3600
+
+# Email Response Cache: a new email whose normalized subject + body embeds within
+# RESPONSE_CACHE_THRESHOLD (cosine) of an answered one reuses that draft, re-personalized.
+# Entries are invalidated when the namespace's index version changes.
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_THRESHOLD = 0.95
+RESPONSE_CACHE_SIZE = 256            # Answered emails kept per namespace (LRU)
+RESPONSE_CACHE_TTL_SECONDS = 86400
+RESPONSE_CACHE_MIN_CONFIDENCE = 0.7  # Fallback and low-confidence replies are not cached
+
+# Document Loading (PDF/DOCX parsing runs in a process pool)
+LOADER_WORKERS = int(os.getenv("LOADER_WORKERS", str(os.cpu_count() or 1)))
+LOADER_FILE_TIMEOUT = 120    # Seconds a worker may stay silent before its file's parse is abandoned
+LOADER_SEGMENT_BATCH = 32    # Pages/paragraphs a worker sends per message while streaming a file
+
+# Streaming Ingestion Pipeline (load -> chunk -> embed -> index, with bounded queues
+# between stages so peak memory depends on the batch size, not the corpus size)
+EMBED_BATCH_SIZE = 64        # Chunks embedded and added to the index per batch
+PIPELINE_QUEUE_SIZE = 4      # Items (documents or batches) buffered between two stages
+INGEST_JOB_HISTORY = 100     # Finished ingestion jobs kept for GET /ingest/{job_id}
+
+# Documents Watcher: re-index a namespace automatically after its documents change.
+# Uses inotify on Linux and falls back to polling file mtimes elsewhere.
+WATCH_DOCUMENTS = os.getenv("WATCH_DOCUMENTS", "false").lower() == "true"
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", "5"))  # Quiet time before a burst is indexed
+WATCH_POLL_INTERVAL = 10.0   # Seconds between directory scans when polling
+
 # Chunking Configuration
+# "recursive" = LangChain's character splitter (CHUNK_SIZE / CHUNK_OVERLAP count characters),
+# "token" = token-aware chunker packing paragraphs and sentences into CHUNK_TOKENS tiktoken tokens
+CHUNKER = os.getenv("CHUNKER", "recursive")
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
+CHUNK_TOKENS = 128
+CHUNK_OVERLAP_TOKENS = 16
+TOKENIZER_ENCODING = "cl100k_base"
+
+# Near-Duplicate Chunks: MinHash signatures over word shingles, looked up with LSH banding.
+# A chunk whose estimated Jaccard similarity to an indexed chunk of the same department reaches
+# DEDUP_THRESHOLD is not indexed again; the kept chunk lists every source under "sources" and
+# matches filters on any of their sources and types. Opt-in until tested on real corpora.
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "false").lower() == "true"
+DEDUP_THRESHOLD = 0.8
+DEDUP_NUM_PERM = 64          # MinHash signature length
+DEDUP_BANDS = 16             # LSH bands of DEDUP_NUM_PERM / DEDUP_BANDS values each
+DEDUP_SHINGLE = 3            # Words per shingle
 
 # Agent Configuration
 AGENT_TEMPERATURE = 0.3
-MAX_ITERATIONS = 5
\ No newline at end of file
+MAX_ITERATIONS = 5
+# The final agent step returns JSON (draft, category, department, confidence, escalate),
+# so no separate LLM call is needed to pick the signing department
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "true").lower() == "true"
+# Async request path: emails processed at once per API worker (others wait their turn),
+# and threads for the CPU-bound query encoding and index search of those requests
+MAX_CONCURRENT_EMAILS = int(os.getenv("MAX_CONCURRENT_EMAILS", "8"))
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "4"))
+
+# LLM Call Cache: exact-match cache of Gemini responses in SQLite, keyed by a hash of the
+# model configuration (model, temperature, stop words...) and the full prompt
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = f"{VECTOR_STORE_PATH}.llmcache.sqlite"
+LLM_CACHE_TTL_SECONDS = 86400
+LLM_CACHE_MAX_ENTRIES = 10_000
+
+# Fast Path: answer plain policy questions with one retrieval on the email and one grounded
+# LLM call instead of the ReAct loop. "off" always runs the agent; "auto" falls back to it
+# when the top hit is weaker than FAST_PATH_MIN_SIMILARITY (cosine; in lexical search mode,
+# when nothing matches); "always" skips that check. Sensitive emails always go to the agent.
+FAST_PATH_MODE = os.getenv("FAST_PATH_MODE", "auto").lower()
+FAST_PATH_MIN_SIMILARITY = 0.5
\ No newline at end of file
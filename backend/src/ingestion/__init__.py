@@ -1,45 +1,180 @@
+import os
+from typing import Any, Callable, Dict, Optional
 from src.ingestion.document_loader import DocumentLoader
-from src.ingestion.vector_store import VectorStore
-from src.config import DOCUMENTS_DIR, VECTOR_STORE_PATH
+from src.ingestion.manifest import IngestionManifest
+from src.ingestion.namespaces import NamespaceRegistry
+from src.ingestion.pipeline import IngestionPipeline
+from src.ingestion.jobs import JobManager
+from src.ingestion.watcher import DocumentWatcher
+from src.config import VECTOR_STORE_PATH, DEDUP_ENABLED
 
-# Initialize vector store (singleton)
-vector_store = VectorStore()
+# Per-namespace vector stores; the default namespace's store is the original singleton
+namespaces = NamespaceRegistry()
+vector_store = namespaces.default
 
-def run_ingestion():
-    """Main ingestion function - reads from DOCUMENTS_DIR"""
+def run_ingestion(full_rebuild: bool = False, namespace: Optional[str] = None,
+                  progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+    """Main ingestion function - reads from the namespace's documents directory
+
+    Only files whose content changed since the last run (per the manifest) are
+    re-parsed and re-embedded; their old chunks are replaced in place. Files are
+    streamed through the ingestion pipeline in fixed-size batches, so memory use
+    does not grow with the number or size of changed files. progress, if given,
+    receives the current phase and running counts as the run advances. A store
+    built with another index type than INDEX_TYPE is rebuilt in full, since
+    incremental runs keep the type of the index they start from.
+
+    With DEDUP_ENABLED, near-duplicate chunks are indexed once (see
+    src.ingestion.dedup). Unchanged files whose duplicates were folded into
+    chunks that are being replaced are re-ingested along with them.
+
+    Runs hold the store's build lock (VectorStore.build_lock), so ingestions
+    from other API workers or the CLI wait and then start from its result.
+    """
     try:
-        print(f"📂 Reading documents from: {DOCUMENTS_DIR}")
-        
-        # Load documents from DOCUMENTS_DIR
-        loader = DocumentLoader()  # ✅ Now defined!
-        documents = loader.load_documents(DOCUMENTS_DIR)
-        
-        if not documents:
+        name = namespaces.resolve(namespace)
+        store = namespaces.get(name)
+        # One build at a time per store, across processes; picks up snapshots others published
+        with store.build_lock():
+            documents_dir = namespaces.documents_dir(name)
+            print(f"📂 Reading documents for namespace '{name}' from: {documents_dir}")
+            
+            report = progress or (lambda update: None)
+            report({"phase": "scanning"})
+            loader = DocumentLoader()
+            manifest = IngestionManifest(store.manifest_path())
+            files = loader.list_document_files(documents_dir)
+            
+            # Fall back to a full rebuild when there is nothing to update in place
+            if not full_rebuild and store.index is not None and not store.matches_index_type():
+                print(f"🔁 Index type changed to '{store.index_type}', rebuilding the whole index")
+                full_rebuild = True
+            if full_rebuild or not manifest.load() or not store.supports_incremental():
+                manifest.files = {}
+                full_rebuild = True
+            
+            changes = manifest.diff(documents_dir, files)
+            to_load = changes["added"] + changes["updated"]
+            
+            # Chunks of changed/deleted files go away, so files that reference them
+            # as near-duplicates must be re-deduplicated too (transitively)
+            replaced_ids = [chunk_id for rel_path in changes["updated"] + changes["removed"]
+                            for chunk_id in manifest.files.get(rel_path, {}).get("chunk_ids", [])]
+            dependents = []
+            while DEDUP_ENABLED and replaced_ids:
+                new = [path for path in manifest.dependents(replaced_ids)
+                       if path not in dependents and path not in to_load and path not in changes["removed"]]
+                if not new:
+                    break
+                dependents.extend(new)
+                replaced_ids.extend(chunk_id for rel_path in new for chunk_id in manifest.files[rel_path]["chunk_ids"])
+            to_load += dependents
+            
+            if not files and (full_rebuild or not changes["removed"]):
+                return {
+                    "status": "error",
+                    "message": "No documents found in the documents directory"
+                }
+            
+            print(f"📄 Found {len(files)} documents: {len(changes['added'])} added, "
+                  f"{len(changes['updated'])} updated, {len(changes['removed'])} removed, "
+                  f"{len(changes['unchanged'])} unchanged")
+            if dependents:
+                print(f"🔗 Re-ingesting {len(dependents)} unchanged documents whose duplicate chunks are replaced")
+            
+            if not to_load and not changes["removed"]:
+                manifest.save()  # Persist refreshed mtimes of touched-but-identical files
+                return {
+                    "status": "success",
+                    "documents_processed": 0,
+                    "chunks_created": 0,
+                    "files_unchanged": len(changes["unchanged"]),
+                    "message": "Index is up to date, no documents changed"
+                }
+            
+            # Stream new or changed files into a snapshot built off to the side:
+            # searches keep using the current one meanwhile
+            builder = store.snapshot_builder(incremental=not full_rebuild)
+            try:
+                report({"phase": "indexing", "files_total": len(to_load)})
+                dedup = builder.deduplicator(excluded=replaced_ids) if DEDUP_ENABLED else None
+                result = IngestionPipeline(store, loader).run(documents_dir, to_load, builder,
+                                                              progress=report, dedup=dedup)
+                chunks_by_file, files_failed = result["chunk_ids"], result["files_failed"]
+                chunks_created = sum(len(ids) for ids in chunks_by_file.values())
+                chunks_deduplicated = sum(len(ids) for ids in result["aliases"].values())
+                print(f"🔪 Created {chunks_created} chunks"
+                      + (f", skipped {chunks_deduplicated} near-duplicates" if chunks_deduplicated else ""))
+                for stage, stats in result["stats"].items():
+                    if isinstance(stats, dict):
+                        print(f"⏱️ {stage}: {stats['items']} items in {stats['seconds']}s "
+                              f"({stats['items_per_second']}/s)")
+            
+                if not chunks_by_file and not changes["removed"]:
+                    builder.abort()
+                    return {
+                        "status": "error",
+                        "documents_processed": 0,
+                        "chunks_created": 0,
+                        "files_failed": files_failed,
+                        "pipeline_stats": result["stats"],
+                        "message": f"All {len(files_failed)} changed documents failed to load"
+                    }
+            
+                # Drop stale chunks of changed/deleted files (incremental runs only).
+                # Files that failed to load keep their previous chunks and are retried next run.
+                stale_ids = []
+                if not full_rebuild:
+                    replaced = [path for path in changes["updated"] + dependents if path in chunks_by_file]
+                    for rel_path in replaced + changes["removed"]:
+                        stale_ids.extend(manifest.forget(rel_path))
+                    for rel_path in dependents:
+                        if rel_path not in chunks_by_file:
+                            manifest.invalidate(rel_path)  # Retry next run, its duplicates may be gone
+                report({"phase": "publishing"})
+                replaced_paths = [os.path.join(documents_dir, rel_path)
+                                  for rel_path in list(chunks_by_file) + changes["removed"]]
+                snapshot, chunks_removed = builder.finish(stale_ids, result["duplicates"], replaced_paths)
+            
+                for rel_path, chunk_ids in chunks_by_file.items():
+                    manifest.record(documents_dir, rel_path, chunk_ids, result["aliases"].get(rel_path, ()))
+            
+                # Persist the snapshot, then swap it in with a single reference flip
+                store.publish(snapshot, manifest)
+            except Exception:
+                builder.abort()
+                raise
+            # The namespace may have been evicted and reloaded while this ran
+            resident = namespaces.resident(name)
+            if resident is not None and resident is not store:
+                resident.activate(snapshot)
+            
             return {
-                "status": "error",
-                "message": "No documents found in the documents directory"
+                "status": "success",
+                "documents_processed": len(chunks_by_file),
+                "chunks_created": chunks_created,
+                "chunks_removed": chunks_removed,
+                "chunks_deduplicated": chunks_deduplicated,
+                "dedup_ratio": round(chunks_deduplicated / (chunks_created + chunks_deduplicated), 4)
+                               if chunks_created + chunks_deduplicated else 0.0,
+                "files_added": [path for path in changes["added"] if path in chunks_by_file],
+                "files_updated": [path for path in changes["updated"] + dependents if path in chunks_by_file],
+                "files_removed": changes["removed"],
+                "files_unchanged": len(changes["unchanged"]),
+                "files_failed": files_failed,
+                "pipeline_stats": result["stats"],
+                "message": f"Successfully processed {len(chunks_by_file)} of {len(files)} documents"
+                           + (f", {len(files_failed)} failed to load" if files_failed else "")
             }
-        
-        print(f"📄 Found {len(documents)} documents")
-        
-        # Chunk and index
-        chunked_docs = loader.chunk_documents(documents)
-        print(f"🔪 Created {len(chunked_docs)} chunks")
-        
-        # Build and save vector store
-        vector_store.build_index(chunked_docs)
-        vector_store.save()
-        
-        return {
-            "status": "success",
-            "documents_processed": len(documents),
-            "chunks_created": len(chunked_docs),
-            "message": f"Successfully processed {len(documents)} documents"
-        }
     except Exception as e:
         print(f"❌ Ingestion error: {e}")
         return {"status": "error", "message": str(e)}
 
+# Ingestion runs requested through the API, executed one at a time
+jobs = JobManager(run_ingestion)
+# Optional automatic re-indexing when documents change (started by the API if WATCH_DOCUMENTS)
+watcher = DocumentWatcher(jobs, namespaces)
+
 # Try to load existing vector store on startup
 try:
     if vector_store.load():
@@ -0,0 +1,306 @@
+import io
+import json
+import os
+import numpy as np
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+# Per-chunk integer metadata stored as columns instead of in the interned table
+ROW_FIELDS = ("chunk_id", "total_chunks", "page")
+MISSING = np.iinfo(np.int32).min
+FILE_SUFFIXES = (".ids.npy", ".offsets.npy", ".text.bin", ".fields.npy",
+                 ".meta_idx.npy", ".meta.json", ".vectors.npy")
+COPY_BLOCK_ROWS = 8192  # Rows copied at a time when streaming an existing store
+
+def load_array(path: str) -> np.ndarray:
+    """Memory-map a .npy file (empty arrays can't be mapped, so load those)"""
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        return np.load(path)
+
+def _replace_file(path: str, write):
+    """Write via a temp file and rename, so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+class ChunkStore:
+    """Columnar, memory-mappable store of chunk texts and metadata, keyed by chunk ID
+
+    Layout (all files prefixed with the store path):
+      .ids.npy       sorted int64 chunk IDs, one per row
+      .offsets.npy   int64 byte offsets of each row's text in the blob (rows + 1)
+      .text.bin      contiguous UTF-8 text of all rows
+      .fields.npy    int32 columns for ROW_FIELDS (MISSING when absent)
+      .meta_idx.npy  int32 row -> index into the interned metadata table
+      .meta.json     interned metadata dicts (everything except ROW_FIELDS)
+      .vectors.npy   exact float32 embedding per row (optional), used for re-ranking
+
+    Loading maps the arrays read-only, so start-up cost does not grow with the
+    corpus and all workers share the same pages through the OS page cache.
+    Only the chunks a search returns are materialized as dicts.
+    """
+
+    def __init__(self, ids: np.ndarray, offsets: np.ndarray, blob: np.ndarray,
+                 fields: np.ndarray, meta_idx: np.ndarray, meta_table: List[Dict[str, Any]],
+                 vectors: Optional[np.ndarray] = None, path: Optional[str] = None,
+                 staged: bool = False):
+        self.ids = ids
+        self.offsets = offsets
+        self.blob = blob
+        self.fields = fields
+        self.meta_idx = meta_idx
+        self.meta_table = meta_table
+        self.vectors = vectors
+        self.path = path      # Files backing the store, if it was loaded or written
+        self.staged = staged  # Written by a ChunkStoreWriter: save() moves the files instead of copying
+
+    @classmethod
+    def from_items(cls, items: Iterable[Tuple[int, Dict[str, Any]]],
+                   vectors: Optional[np.ndarray] = None) -> "ChunkStore":
+        """Build an in-memory store from (chunk ID, document) pairs
+
+        vectors, if given, holds one embedding per item in the same order.
+        """
+        items = list(items)
+        order = np.argsort([doc_id for doc_id, _ in items], kind="stable").astype(np.int64)
+        writer = ChunkStoreWriter()
+        writer.append([items[i] for i in order], None if vectors is None else np.asarray(vectors)[order])
+        return writer.finish()
+
+    @classmethod
+    def empty(cls) -> "ChunkStore":
+        return cls.from_items([])
+
+    @classmethod
+    def load(cls, path: str, staged: bool = False) -> "ChunkStore":
+        """Memory-map a saved store"""
+        with open(f"{path}.meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        stored_fields = tuple(meta["row_fields"])
+        if not set(stored_fields) <= set(ROW_FIELDS):
+            raise ValueError("Chunk store was written with different row fields")
+
+        if os.path.getsize(f"{path}.text.bin"):
+            blob = np.memmap(f"{path}.text.bin", dtype=np.uint8, mode="r")
+        else:
+            blob = np.zeros(0, dtype=np.uint8)
+
+        vectors = load_array(f"{path}.vectors.npy") if os.path.exists(f"{path}.vectors.npy") else None
+
+        fields = load_array(f"{path}.fields.npy")
+        if stored_fields != ROW_FIELDS:
+            # Stores written before a row field existed: add its column as MISSING
+            columns = np.full((len(fields), len(ROW_FIELDS)), MISSING, dtype=np.int32)
+            for col, field in enumerate(stored_fields):
+                columns[:, ROW_FIELDS.index(field)] = fields[:, col]
+            fields = columns
+
+        return cls(
+            load_array(f"{path}.ids.npy"),
+            load_array(f"{path}.offsets.npy"),
+            blob,
+            fields,
+            load_array(f"{path}.meta_idx.npy"),
+            meta["table"],
+            vectors,
+            path=path,
+            staged=staged
+        )
+
+    def save(self, path: str):
+        """Write all columns to disk (staged stores are moved there instead)"""
+        if self.staged:
+            for suffix in FILE_SUFFIXES:
+                if os.path.exists(f"{self.path}{suffix}"):
+                    os.replace(f"{self.path}{suffix}", f"{path}{suffix}")
+            try:
+                os.rmdir(os.path.dirname(self.path))  # Drop the staging directory once empty
+            except OSError:
+                pass
+            self.path, self.staged = path, False
+            return
+        if self.vectors is not None:
+            _replace_file(f"{path}.vectors.npy", lambda f: np.save(f, self.vectors))
+        _replace_file(f"{path}.text.bin", lambda f: f.write(memoryview(self.blob)))
+        self._save_columns(path)
+
+    def _save_columns(self, path: str):
+        """Write the per-row columns and metadata table (not the text or vectors)"""
+        for name, array in (("ids", self.ids), ("offsets", self.offsets),
+                            ("fields", self.fields), ("meta_idx", self.meta_idx)):
+            _replace_file(f"{path}.{name}.npy", lambda f, array=array: np.save(f, array))
+        _replace_file(
+            f"{path}.meta.json",
+            lambda f: f.write(json.dumps({"row_fields": ROW_FIELDS, "table": self.meta_table}).encode("utf-8"))
+        )
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(f"{path}.meta.json")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _row(self, doc_id: int) -> Optional[int]:
+        row = int(np.searchsorted(self.ids, doc_id))
+        if row < len(self.ids) and self.ids[row] == doc_id:
+            return row
+        return None
+
+    def __contains__(self, doc_id: int) -> bool:
+        return self._row(doc_id) is not None
+
+    def __getitem__(self, doc_id: int) -> Dict[str, Any]:
+        row = self._row(doc_id)
+        if row is None:
+            raise KeyError(doc_id)
+        return self._materialize(row)
+
+    def _text(self, row: int) -> str:
+        return bytes(self.blob[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+    def _materialize(self, row: int) -> Dict[str, Any]:
+        """Build the {"text", "metadata"} dict for one row"""
+        metadata = dict(self.meta_table[self.meta_idx[row]])
+        for field, value in zip(ROW_FIELDS, self.fields[row].tolist()):
+            if value != MISSING:
+                metadata[field] = value
+        return {"text": self._text(row), "metadata": metadata}
+
+    def vectors_for(self, doc_ids: np.ndarray) -> np.ndarray:
+        """Exact embeddings for existing chunk IDs (any shape), as (*shape, dim)"""
+        rows = np.searchsorted(self.ids, doc_ids)
+        return np.asarray(self.vectors[rows.ravel()]).reshape(*rows.shape, -1)
+
+    def texts(self) -> Iterator[str]:
+        """Iterate over chunk texts in ID order"""
+        for row in range(len(self.ids)):
+            yield self._text(row)
+
+class ChunkStoreWriter:
+    """Builds a chunk store batch by batch, in memory or straight to disk
+
+    Rows must arrive in increasing chunk ID order. With a path, texts and
+    vectors are written to files as they arrive, so only the small per-row
+    columns (about 30 bytes per chunk) stay in memory; finish() returns the
+    store memory-mapped from those files, marked as staged. Vectors are only
+    kept if every appended batch has them.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._text = open(f"{path}.text.bin", "wb") if path else io.BytesIO()
+        self._vectors = open(f"{path}.vectors.f32", "wb") if path else io.BytesIO()
+        self._keep_vectors = True
+        self.dim = None
+        self._ids, self._lengths, self._fields, self._meta_idx = [], [], [], []
+        self.meta_table: List[Dict[str, Any]] = []
+        self._interned: Dict[str, int] = {}
+        self.last_id = None
+        self.num_rows = 0
+
+    def _intern(self, metadata: Dict[str, Any]) -> int:
+        key = json.dumps(metadata, sort_keys=True)
+        if key not in self._interned:
+            self._interned[key] = len(self.meta_table)
+            self.meta_table.append(metadata)
+        return self._interned[key]
+
+    def _check_ids(self, ids: np.ndarray):
+        if len(ids) and ((self.last_id is not None and ids[0] <= self.last_id) or np.any(np.diff(ids) <= 0)):
+            raise ValueError("Chunk IDs must be appended in increasing order")
+        if len(ids):
+            self.last_id = int(ids[-1])
+
+    def _write_vectors(self, vectors: Optional[np.ndarray], num_rows: int):
+        if not num_rows or not self._keep_vectors:
+            return
+        if vectors is None:
+            self._keep_vectors = False
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.dim = vectors.shape[1]
+        self._vectors.write(memoryview(vectors).cast("B"))
+
+    def append(self, items: List[Tuple[int, Dict[str, Any]]], vectors: Optional[np.ndarray] = None):
+        """Append (chunk ID, document) pairs, with one embedding per item if available"""
+        ids = np.array([doc_id for doc_id, _ in items], dtype=np.int64)
+        self._check_ids(ids)
+        texts = [doc["text"].encode("utf-8") for _, doc in items]
+        fields = np.full((len(items), len(ROW_FIELDS)), MISSING, dtype=np.int32)
+        meta_idx = np.zeros(len(items), dtype=np.int32)
+        for row, (_, doc) in enumerate(items):
+            metadata = dict(doc.get("metadata", {}))
+            for col, field in enumerate(ROW_FIELDS):
+                if field in metadata:
+                    fields[row, col] = metadata.pop(field)
+            meta_idx[row] = self._intern(metadata)
+
+        self._text.write(b"".join(texts))
+        self._write_vectors(vectors, len(items))
+        self._ids.append(ids)
+        self._lengths.append(np.array([len(text) for text in texts], dtype=np.int64))
+        self._fields.append(fields)
+        self._meta_idx.append(meta_idx)
+        self.num_rows += len(items)
+
+    def append_store(self, store: ChunkStore, keep: Optional[np.ndarray] = None):
+        """Append the (kept) rows of an existing store, copying them in blocks without decoding"""
+        remap = np.array([self._intern(metadata) for metadata in store.meta_table] + [0], dtype=np.int32)
+        if store.vectors is not None and self.dim is None:
+            self.dim = store.vectors.shape[1]
+        lengths = np.diff(store.offsets)
+        for start in range(0, len(store), COPY_BLOCK_ROWS):
+            end = min(start + COPY_BLOCK_ROWS, len(store))
+            block_keep = np.ones(end - start, dtype=bool) if keep is None else keep[start:end]
+            if not block_keep.any():
+                continue
+            ids = np.asarray(store.ids[start:end])[block_keep]
+            self._check_ids(ids)
+            blob = np.asarray(store.blob[store.offsets[start]:store.offsets[end]])
+            self._text.write(blob[np.repeat(block_keep, lengths[start:end])].tobytes())
+            vectors = None if store.vectors is None else np.asarray(store.vectors[start:end])[block_keep]
+            self._write_vectors(vectors, len(ids))
+            self._ids.append(ids)
+            self._lengths.append(lengths[start:end][block_keep])
+            self._fields.append(np.asarray(store.fields[start:end])[block_keep])
+            self._meta_idx.append(remap[np.asarray(store.meta_idx[start:end])[block_keep]])
+            self.num_rows += len(ids)
+
+    def finish(self) -> ChunkStore:
+        ids = np.concatenate(self._ids) if self._ids else np.zeros(0, dtype=np.int64)
+        lengths = np.concatenate(self._lengths) if self._lengths else np.zeros(0, dtype=np.int64)
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        fields = (np.concatenate(self._fields) if self._fields
+                  else np.full((0, len(ROW_FIELDS)), MISSING, dtype=np.int32))
+        meta_idx = np.concatenate(self._meta_idx).astype(np.int32) if self._meta_idx else np.zeros(0, dtype=np.int32)
+        keep_vectors = self._keep_vectors and (self.dim is not None or not len(ids))
+
+        if self.path is None:
+            vectors = None
+            if keep_vectors and self.dim is not None:
+                vectors = np.frombuffer(self._vectors.getvalue(), dtype=np.float32).reshape(-1, self.dim).copy()
+            blob = np.frombuffer(self._text.getvalue(), dtype=np.uint8)
+            return ChunkStore(ids, offsets, blob, fields, meta_idx, self.meta_table, vectors)
+
+        self._text.close()
+        self._vectors.close()
+        raw_path = f"{self.path}.vectors.f32"
+        if keep_vectors and self.dim is not None and not len(ids):
+            np.save(f"{self.path}.vectors.npy", np.zeros((0, self.dim), dtype=np.float32))
+        elif keep_vectors and self.dim is not None:
+            # Wrap the raw vectors in a .npy file, copying in blocks to keep memory flat
+            raw = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(len(ids), self.dim))
+            target = np.lib.format.open_memmap(
+                f"{self.path}.vectors.npy", mode="w+", dtype=np.float32, shape=(len(ids), self.dim)
+            )
+            for start in range(0, len(ids), COPY_BLOCK_ROWS):
+                target[start:start + COPY_BLOCK_ROWS] = raw[start:start + COPY_BLOCK_ROWS]
+            target.flush()
+            del raw, target
+        os.remove(raw_path)
+        ChunkStore(ids, offsets, np.zeros(0, dtype=np.uint8), fields, meta_idx, self.meta_table)._save_columns(self.path)
+        return ChunkStore.load(self.path, staged=True)
@@ -0,0 +1,82 @@
+import re
+from collections import deque
+from typing import List, Iterator, Tuple
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from src.config import (
+    CHUNKER, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, TOKENIZER_ENCODING
+)
+
+CHUNKERS = ("recursive", "token")
+
+# Where the token chunker may cut: after blank lines, line breaks and sentence ends
+BOUNDARY_PATTERN = re.compile(r"\n\s*\n|\n|(?<=[.!?])\s+")
+
+class TokenChunker:
+    """Packs paragraphs and sentences into chunks of at most max_tokens tokens
+
+    One linear pass: the text is cut at paragraph, line and sentence boundaries,
+    each piece is tokenized once with tiktoken, and pieces are packed greedily
+    into chunks. A chunk repeats the trailing pieces of the previous one worth
+    up to overlap_tokens. Pieces longer than the budget are cut at token
+    boundaries. Chunks are exact substrings of the text, like the recursive
+    splitter's, and the same split_text() interface is used.
+    """
+
+    def __init__(self, max_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                 encoding_name: str = TOKENIZER_ENCODING):
+        import tiktoken
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode_ordinary(text))
+
+    def _measure(self, text: str, start: int, end: int) -> Iterator[Tuple[int, int, int]]:
+        """(start, end, tokens) of a piece, cut into budget-sized parts if needed"""
+        tokens = self.encoding.encode_ordinary(text[start:end])
+        if len(tokens) <= self.max_tokens:
+            yield start, end, len(tokens)
+            return
+        _, offsets = self.encoding.decode_with_offsets(tokens)
+        for first in range(0, len(tokens), self.max_tokens):
+            last = first + self.max_tokens
+            yield (start + offsets[first], start + offsets[last] if last < len(tokens) else end,
+                   min(self.max_tokens, len(tokens) - first))
+
+    def _pieces(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        start = 0
+        for match in BOUNDARY_PATTERN.finditer(text):
+            yield from self._measure(text, start, match.end())
+            start = match.end()
+        if start < len(text):
+            yield from self._measure(text, start, len(text))
+
+    def split_text(self, text: str) -> List[str]:
+        chunks = []
+        window = deque()  # Pieces of the chunk being filled
+        total = 0
+        for piece in self._pieces(text):
+            if window and total + piece[2] > self.max_tokens:
+                chunks.append(text[window[0][0]:window[-1][1]])
+                # Keep the trailing pieces that fit in the overlap (and leave room for this one)
+                while window and (total > self.overlap_tokens or total + piece[2] > self.max_tokens):
+                    total -= window.popleft()[2]
+            window.append(piece)
+            total += piece[2]
+        if window:
+            chunks.append(text[window[0][0]:window[-1][1]])
+        return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+def get_chunker(name: str = CHUNKER):
+    """The configured text splitter; anything with split_text(text) -> List[str]"""
+    if name == "token":
+        return TokenChunker()
+    if name == "recursive":
+        return RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],
+            length_function=len
+        )
+    raise ValueError(f"Unknown chunker '{name}', expected one of {CHUNKERS}")
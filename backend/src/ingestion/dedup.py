@@ -0,0 +1,105 @@
+import hashlib
+import numpy as np
+from typing import List, Dict, Iterable, Optional, Tuple
+from src.config import DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS, DEDUP_SHINGLE, DEFAULT_DEPARTMENT
+from src.ingestion.lexical_index import tokenize
+
+_PRIME = np.uint64(4294967291)  # Largest prime below 2**32
+# Fixed seed: signatures are saved with snapshots and must stay comparable across runs
+_rng = np.random.default_rng(20240607)
+_A = _rng.integers(1, 2 ** 31, DEDUP_NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 2 ** 31, DEDUP_NUM_PERM, dtype=np.uint64)
+
+def stable_hash(text: str, size: int = 8) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=size).digest(), "little")
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature (DEDUP_NUM_PERM uint32 values) of a text's word shingles"""
+    tokens = tokenize(text)
+    size = max(1, min(DEDUP_SHINGLE, len(tokens)))
+    shingles = {" ".join(tokens[i:i + size]) for i in range(max(1, len(tokens) - size + 1))}
+    hashes = np.array([stable_hash(shingle, 4) for shingle in shingles], dtype=np.uint64)
+    # a * x + b stays below 2**64 because a, b < 2**31 and x < 2**32
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0).astype(np.uint32)
+
+def minhashes(texts: Iterable[str]) -> np.ndarray:
+    signatures = [minhash(text) for text in texts]
+    return np.array(signatures, dtype=np.uint32).reshape(len(signatures), DEDUP_NUM_PERM)
+
+def group_of(metadata: Dict) -> int:
+    """Chunks are only deduplicated within a department, so department filters stay exact"""
+    return stable_hash(str(metadata.get("department") or DEFAULT_DEPARTMENT).lower())
+
+def band_keys(signatures: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """(n, DEDUP_BANDS) uint64 LSH keys; chunks of different groups never share a key"""
+    rows = signatures.shape[1] // DEDUP_BANDS
+    bands = signatures[:, :rows * DEDUP_BANDS].astype(np.uint64).reshape(len(signatures), DEDUP_BANDS, rows)
+    keys = np.repeat(np.asarray(groups, dtype=np.uint64)[:, None], DEDUP_BANDS, axis=1)
+    for row in range(rows):
+        keys = (keys * np.uint64(1099511628211)) ^ bands[:, :, row]  # FNV-style mixing, wraps mod 2**64
+    return keys
+
+class _BandTable:
+    """(key, chunk ID) pairs of one LSH band: a sorted array plus a short unsorted tail"""
+
+    def __init__(self):
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.tail: Dict[int, List[int]] = {}
+        self.tail_size = 0
+
+    def add(self, keys: np.ndarray, ids: np.ndarray):
+        for key, doc_id in zip(keys.tolist(), ids.tolist()):
+            self.tail.setdefault(key, []).append(doc_id)
+        self.tail_size += len(ids)
+        if self.tail_size > max(1024, len(self.keys) // 8):
+            # Merge the tail into the sorted arrays (amortized: the tail grows with the table)
+            tail_keys = np.array([key for key, ids in self.tail.items() for _ in ids], dtype=np.uint64)
+            tail_ids = np.array([doc_id for ids in self.tail.values() for doc_id in ids], dtype=np.int64)
+            keys, ids = np.concatenate([self.keys, tail_keys]), np.concatenate([self.ids, tail_ids])
+            order = np.argsort(keys, kind="stable")
+            self.keys, self.ids = keys[order], ids[order]
+            self.tail, self.tail_size = {}, 0
+
+    def lookup(self, key: int) -> List[int]:
+        start = np.searchsorted(self.keys, np.uint64(key), side="left")
+        end = np.searchsorted(self.keys, np.uint64(key), side="right")
+        return self.ids[start:end].tolist() + self.tail.get(key, [])
+
+class NearDuplicateIndex:
+    """MinHash LSH index answering "which indexed chunk does this one nearly duplicate?"
+
+    Candidates share at least one band key with the query and are confirmed
+    by the fraction of equal signature values, an estimate of the Jaccard
+    similarity of the two chunks' shingle sets. Excluded IDs (chunks about to
+    be replaced) are never returned.
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, excluded: Iterable[int] = ()):
+        self.threshold = threshold
+        self.tables = [_BandTable() for _ in range(DEDUP_BANDS)]
+        self.signatures: Dict[int, np.ndarray] = {}
+        self.excluded = set(int(doc_id) for doc_id in excluded)
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def add(self, ids: np.ndarray, signatures: np.ndarray, groups: np.ndarray):
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        keys = band_keys(signatures, groups)
+        for band, table in enumerate(self.tables):
+            table.add(keys[:, band], ids)
+        self.signatures.update(zip(ids.tolist(), signatures))
+
+    def find(self, signature: np.ndarray, group: int) -> Tuple[Optional[int], float]:
+        """The most similar indexed chunk at or above the threshold (or None), and its similarity"""
+        keys = band_keys(signature[None], np.array([group], dtype=np.uint64))[0].tolist()
+        candidates = {doc_id for table, key in zip(self.tables, keys) for doc_id in table.lookup(key)}
+        best, best_similarity = None, 0.0
+        for doc_id in candidates - self.excluded:
+            similarity = float(np.mean(self.signatures[doc_id] == signature))
+            if similarity >= self.threshold and similarity > best_similarity:
+                best, best_similarity = doc_id, similarity
+        return best, best_similarity
@@ -0,0 +1,96 @@
+import numpy as np
+from typing import List, Dict, Any
+from src.config import MMR_LAMBDA, MMR_MAX_MERGED_CHUNKS
+
+def mmr_order(relevance: np.ndarray, vectors: np.ndarray, lambda_mult: float = MMR_LAMBDA) -> np.ndarray:
+    """Greedy maximal-marginal-relevance ordering of candidates
+
+    relevance holds one score per candidate (higher is better) and vectors their
+    normalized embeddings. Each step picks the candidate maximizing
+    lambda * relevance - (1 - lambda) * (max similarity to those already picked),
+    using one candidate-by-candidate similarity matrix computed up front.
+    """
+    num_candidates = len(relevance)
+    if num_candidates == 0:
+        return np.zeros(0, dtype=np.int64)
+    similarity = vectors @ vectors.T
+    redundancy = np.zeros(num_candidates, dtype=np.float32)
+    available = np.ones(num_candidates, dtype=bool)
+    order = np.empty(num_candidates, dtype=np.int64)
+    for step in range(num_candidates):
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        pick = int(np.argmax(scores))
+        order[step] = pick
+        available[pick] = False
+        redundancy = np.maximum(redundancy, similarity[pick]) if step else similarity[pick]
+    return order
+
+def merge_overlapping(first: str, second: str) -> str:
+    """Join two consecutive chunks, dropping the text the splitter repeated in both
+
+    Only word-aligned overlaps count, so "go to the" + "e end" does not
+    become "go to the end".
+    """
+    for size in range(min(len(first), len(second)), 0, -1):
+        starts_word = size == len(first) or not (first[-size - 1].isalnum() and first[-size].isalnum())
+        ends_word = size == len(second) or not (second[size - 1].isalnum() and second[size].isalnum())
+        if starts_word and ends_word and first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first} {second}"
+
+def _document_key(metadata: Dict[str, Any]):
+    return metadata.get("path", metadata.get("source"))
+
+def collapse_adjacent(hits: List[Dict[str, Any]], k: int,
+                     max_chunks: int = MMR_MAX_MERGED_CHUNKS) -> List[Dict[str, Any]]:
+    """Take ranked hits until k passages are formed, merging direct neighbours of picked chunks
+
+    A hit whose chunk_id is next to the chunk that started a passage (same
+    document) joins that passage instead of using up a slot, as long as the
+    passage has fewer than max_chunks chunks; neighbours of joined chunks never
+    chain on. Merged passages keep the picked chunk's metadata plus "chunk_ids"
+    and "match_start" (where the picked chunk starts in the merged text), and
+    the best score of their parts.
+    """
+    groups: List[List[Dict[str, Any]]] = []  # The picked chunk comes first
+    for hit in hits:
+        metadata = hit["document"]["metadata"]
+        chunk_id = metadata.get("chunk_id")
+        joined = next((
+            group for group in groups
+            if chunk_id is not None and len(group) < max_chunks
+            and _document_key(group[0]["document"]["metadata"]) == _document_key(metadata)
+            and abs(group[0]["document"]["metadata"].get("chunk_id", chunk_id) - chunk_id) == 1
+        ), None)
+        if joined is not None:
+            joined.append(hit)
+        elif len(groups) < k:
+            groups.append([hit])
+        else:
+            break
+    return [_merge_group(group) for group in groups]
+
+def _merge_group(group: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if len(group) == 1:
+        return group[0]
+    picked = group[0]
+    parts = sorted(group, key=lambda hit: hit["document"]["metadata"]["chunk_id"])
+    text = parts[0]["document"]["text"]
+    match_start = 0
+    for part in parts[1:]:
+        text = merge_overlapping(text, part["document"]["text"])
+        if part is picked:
+            # A merged text always ends with the whole chunk just appended
+            match_start = len(text) - len(part["document"]["text"])
+    merged = {
+        "document": {
+            "text": text,
+            "metadata": {**picked["document"]["metadata"],
+                         "chunk_ids": [part["document"]["metadata"]["chunk_id"] for part in parts],
+                         "match_start": match_start}
+        }
+    }
+    for name in group[0]:
+        if name != "document":
+            merged[name] = max(hit[name] for hit in group)
+    return merged
@@ -1,86 +1,344 @@
+import bisect
+import multiprocessing
 import os
-from typing import List, Dict, Any
+import queue
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from pypdf import PdfReader
 from docx import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from src.config import CHUNK_SIZE, CHUNK_OVERLAP
+from docx.oxml.ns import qn
+from src.config import (
+    CHUNK_SIZE, CHUNKER, DEFAULT_DEPARTMENT, LOADER_WORKERS, LOADER_FILE_TIMEOUT, LOADER_SEGMENT_BATCH
+)
+from src.ingestion.chunkers import get_chunker
+
+SPLIT_WINDOW = 20 * CHUNK_SIZE  # Characters of a document buffered before splitting them into chunks
+
+def _load_worker(conn, batch_size: int = LOADER_SEGMENT_BATCH):
+    """Worker process: load (directory, rel_path) tasks until sent None
+
+    Each file is streamed back as ("document", metadata), then ("segments", list)
+    messages of up to batch_size segments and ("done", None); ("error", message)
+    ends a file at any point. Sends block while the pipe is full, so a worker
+    only parses ahead of its reader by about one pipe buffer.
+    """
+    loader = DocumentLoader()
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        directory_path, rel_path = task
+        try:
+            document = loader.load_file(directory_path, rel_path)
+            conn.send(("document", document["metadata"]))
+            group = []
+            for segment in document["segments"]:
+                group.append(segment)
+                if len(group) >= batch_size:
+                    conn.send(("segments", group))
+                    group = []
+            if group:
+                conn.send(("segments", group))
+            conn.send(("done", None))
+        except Exception as e:
+            conn.send(("error", str(e)))
 
 class DocumentLoader:
-    def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP,
-            separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],
-            length_function=len
-        )
+    def __init__(self, chunker: Optional[str] = None):
+        self.text_splitter = get_chunker(chunker or CHUNKER)
     
-    def load_pdf(self, file_path: str) -> str:
-        """Extract text from PDF file"""
+    def iter_pdf_pages(self, file_path: str) -> Iterator[Tuple[int, str]]:
+        """Yield (page number, text) for each PDF page, extracting pages lazily"""
         try:
             reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+            for number, page in enumerate(reader.pages, start=1):
+                yield number, page.extract_text() or ""  # Image-only pages have no text
         except Exception as e:
             raise Exception(f"Error loading PDF {file_path}: {str(e)}")
     
-    def load_docx(self, file_path: str) -> str:
-        """Extract text from DOCX file"""
+    def iter_docx_paragraphs(self, file_path: str) -> Iterator[Tuple[int, str]]:
+        """Yield (page number, text) for each DOCX paragraph
+
+        DOCX files have no fixed pages, so pages are counted from explicit page
+        breaks (page-break runs and "page break before" paragraphs).
+        """
         try:
             doc = Document(file_path)
-            text = ""
+            page = 1
             for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
+                if paragraph.paragraph_format.page_break_before:
+                    page += 1
+                yield page, paragraph.text
+                page += sum(1 for br in paragraph._p.iter(qn("w:br")) if br.get(qn("w:type")) == "page")
         except Exception as e:
             raise Exception(f"Error loading DOCX {file_path}: {str(e)}")
     
-    def load_documents(self, directory_path: str) -> List[Dict[str, Any]]:
-        """Load all documents from directory"""
-        documents = []
+    def load_pdf(self, file_path: str) -> str:
+        """Extract text from PDF file"""
+        return "".join(f"{text}\n" for _, text in self.iter_pdf_pages(file_path))
+    
+    def load_docx(self, file_path: str) -> str:
+        """Extract text from DOCX file"""
+        return "".join(f"{text}\n" for _, text in self.iter_docx_paragraphs(file_path))
+    
+    def list_document_files(self, directory_path: str) -> List[str]:
+        """List supported document files in directory and its subdirectories (paths relative to it)"""
+        files = []
+        for root, _, filenames in os.walk(directory_path):
+            for filename in filenames:
+                if filename.endswith(('.pdf', '.docx')):
+                    rel_path = os.path.relpath(os.path.join(root, filename), directory_path)
+                    files.append(rel_path.replace(os.sep, "/"))
+        return sorted(files)
+    
+    def department_for(self, rel_path: str) -> str:
+        """Department tag from the first-level subdirectory (e.g. hr/leave.pdf -> hr)"""
+        parts = rel_path.split("/")
+        return parts[0].lower() if len(parts) > 1 else DEFAULT_DEPARTMENT
+    
+    def load_file(self, directory_path: str, rel_path: str) -> Dict[str, Any]:
+        """Load a single PDF or DOCX file (path relative to directory) with its metadata
+
+        The text is kept as (page number, text) segments rather than one string.
+        segments is a lazy iterator: pages are parsed as they are consumed, and
+        parse errors are raised from it.
+        """
+        file_path = os.path.join(directory_path, rel_path)
+        filename = os.path.basename(file_path)
         
-        for filename in os.listdir(directory_path):
-            file_path = os.path.join(directory_path, filename)
-            
-            if filename.endswith('.pdf'):
-                text = self.load_pdf(file_path)
-                documents.append({
-                    "text": text,
-                    "metadata": {
-                        "source": filename,
-                        "type": "pdf",
-                        "path": file_path
-                    }
-                })
-            elif filename.endswith('.docx'):
-                text = self.load_docx(file_path)
-                documents.append({
-                    "text": text,
-                    "metadata": {
-                        "source": filename,
-                        "type": "docx",
-                        "path": file_path
-                    }
-                })
+        if filename.endswith('.pdf'):
+            segments, doc_type = self.iter_pdf_pages(file_path), "pdf"
+        elif filename.endswith('.docx'):
+            segments, doc_type = self.iter_docx_paragraphs(file_path), "docx"
+        else:
+            raise ValueError(f"Unsupported document type: {filename}")
+        
+        return {
+            "segments": segments,
+            "metadata": {
+                "source": filename,
+                "type": doc_type,
+                "department": self.department_for(rel_path),
+                "path": file_path
+            }
+        }
+    
+    def iter_load_files(self, directory_path: str, rel_paths: List[str],
+                        workers: int = LOADER_WORKERS,
+                        timeout: float = LOADER_FILE_TIMEOUT) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+        """Load files in parallel, yielding (rel_path, document, error) as each one starts
+
+        Each worker process parses one file at a time and streams its segments
+        over a pipe while the caller iterates document["segments"], so a file is
+        never held in memory whole. The caller must consume (or close) each
+        document's segments: the worker is only reused afterwards. A worker that
+        stays silent for timeout seconds is killed, and a file that fails
+        yields its error (document None), or raises it from the segments if
+        its pages were already being streamed.
+        """
+        if workers <= 1 or len(rel_paths) <= 1:
+            for rel_path in rel_paths:
+                try:
+                    yield rel_path, self.load_file(directory_path, rel_path), None
+                except Exception as e:
+                    yield rel_path, None, str(e)
+            return
+        
+        # fork: workers inherit the loaded modules instead of re-importing src.ingestion
+        # (which would load the embedding model in every worker)
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        pending = deque(rel_paths)
+        busy = {}  # connection -> (process, rel_path, start time), until the file's first message
+        streaming = {}  # connection -> process, while the caller reads the file's segments
+        finished = queue.SimpleQueue()  # (connection, whether its stream ended cleanly)
+        idle = []
+        
+        def start_worker():
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_load_worker, args=(child_conn,), daemon=True)
+            process.start()
+            child_conn.close()
+            idle.append((parent_conn, process))
+        
+        def stream_segments(conn) -> Iterator[Tuple[int, str]]:
+            """Runs in the caller: yield segments as the worker sends them"""
+            complete = False
+            try:
+                while True:
+                    if not conn.poll(timeout):
+                        raise Exception(f"Timed out after {timeout:.0f}s")
+                    try:
+                        kind, payload = conn.recv()
+                    except EOFError:
+                        raise Exception("Loader process crashed")
+                    if kind == "done":
+                        complete = True
+                        return
+                    if kind == "error":
+                        raise Exception(payload)
+                    yield from payload
+            finally:
+                finished.put((conn, complete))
+        
+        def reclaim(conn, complete: bool):
+            process = streaming.pop(conn)
+            if complete:
+                idle.append((conn, process))
+                return
+            # Abandoned mid-file: the worker may still be parsing or blocked on a send
+            process.kill()
+            process.join()
+            conn.close()
+            if pending:
+                start_worker()
         
+        try:
+            for _ in range(min(workers, len(rel_paths))):
+                start_worker()
+            while pending or busy or streaming:
+                while not finished.empty():
+                    reclaim(*finished.get())
+                while pending and idle:
+                    conn, process = idle.pop()
+                    rel_path = pending.popleft()
+                    conn.send((directory_path, rel_path))
+                    busy[conn] = (process, rel_path, time.monotonic())
+                
+                if not busy:
+                    # Only streams are left: wait for the caller to finish one
+                    try:
+                        reclaim(*finished.get(timeout=1.0))
+                    except queue.Empty:
+                        pass
+                    continue
+                
+                for conn in wait(list(busy), timeout=1.0):
+                    process, rel_path, _ = busy.pop(conn)
+                    try:
+                        kind, payload = conn.recv()
+                    except EOFError:
+                        process.join()
+                        conn.close()
+                        if pending:
+                            start_worker()
+                        yield rel_path, None, f"Loader process crashed (exit code {process.exitcode})"
+                        continue
+                    if kind == "error":
+                        idle.append((conn, process))
+                        yield rel_path, None, payload
+                        continue
+                    streaming[conn] = process
+                    yield rel_path, {"segments": stream_segments(conn), "metadata": payload}, None
+                
+                now = time.monotonic()
+                for conn, (process, rel_path, started) in list(busy.items()):
+                    # A worker whose answer waits while the caller is busy has not timed out
+                    if now - started > timeout and not conn.poll():
+                        del busy[conn]
+                        process.kill()
+                        process.join()
+                        conn.close()
+                        if pending:
+                            start_worker()
+                        yield rel_path, None, f"Timed out after {timeout:.0f}s"
+        finally:
+            for conn, process in idle:
+                try:
+                    conn.send(None)
+                except OSError:
+                    pass
+            abandoned = [(conn, entry[0]) for conn, entry in busy.items()] + list(streaming.items())
+            for conn, process in abandoned:
+                process.kill()
+            for conn, process in idle + abandoned:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.kill()
+                conn.close()
+    
+    def load_documents(self, directory_path: str, workers: int = LOADER_WORKERS) -> List[Dict[str, Any]]:
+        """Load all documents from directory (in parallel), skipping files that fail to load
+
+        Segments are read into lists here, so every document is fully in memory.
+        """
+        documents = []
+        for rel_path, document, error in self.iter_load_files(
+            directory_path, self.list_document_files(directory_path), workers
+        ):
+            if not error:
+                try:
+                    document["segments"] = list(document["segments"])
+                except Exception as e:
+                    error = str(e)
+            if error:
+                print(f"⚠️ Skipping {rel_path}: {error}")
+            else:
+                documents.append(document)
         return documents
     
+    def iter_chunks(self, segments: Iterable[Tuple[Optional[int], str]]) -> Iterator[Tuple[str, Optional[int]]]:
+        """Split a stream of (page, text) segments into (chunk, page of its first character)
+
+        Segments are joined with newlines, but only SPLIT_WINDOW characters at a
+        time: all chunks of the window except the last are emitted, and
+        splitting resumes from where that last chunk starts.
+        """
+        parts, length = [], 0
+        starts, pages = [], []  # Window offset and page of each buffered segment
+        
+        def split(final: bool):
+            nonlocal parts, length, starts, pages
+            window = "".join(parts)
+            located, cursor = [], 0
+            for chunk in self.text_splitter.split_text(window):
+                start = window.find(chunk, cursor)
+                start = cursor if start < 0 else start
+                located.append((start, chunk))
+                cursor = start + 1
+            emit = located if final or not located else located[:-1]
+            for start, chunk in emit:
+                yield chunk, pages[bisect.bisect_right(starts, start) - 1]
+            if final or not located:
+                parts, length, starts, pages = [], 0, [], []
+                return
+            # Keep the unfinished tail (from the last chunk's start) for the next window
+            keep = located[-1][0]
+            first = bisect.bisect_right(starts, keep) - 1
+            parts, length = [window[keep:]], len(window) - keep
+            starts = [0] + [start - keep for start in starts[first + 1:]]
+            pages = pages[first:]
+        
+        for page, text in segments:
+            starts.append(length)
+            pages.append(page)
+            parts.append(f"{text}\n")
+            length += len(text) + 1
+            if length >= SPLIT_WINDOW:
+                yield from split(final=False)
+        if parts:
+            yield from split(final=True)
+    
     def chunk_documents(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Split documents into chunks"""
+        """Split documents into chunks, tagging each with the page it starts on
+
+        Documents carry either (page, text) "segments" or a plain "text".
+        """
         chunked_docs = []
         
         for doc in documents:
-            chunks = self.text_splitter.split_text(doc["text"])
+            chunks = list(self.iter_chunks(doc["segments"] if "segments" in doc else [(None, doc["text"])]))
             
-            for i, chunk in enumerate(chunks):
-                chunked_docs.append({
-                    "text": chunk,
-                    "metadata": {
-                        **doc["metadata"],
-                        "chunk_id": i,
-                        "total_chunks": len(chunks)
-                    }
-                })
+            for i, (chunk, page) in enumerate(chunks):
+                metadata = {
+                    **doc["metadata"],
+                    "chunk_id": i,
+                    "total_chunks": len(chunks)
+                }
+                if page is not None:
+                    metadata["page"] = page
+                chunked_docs.append({"text": chunk, "metadata": metadata})
         
-        return chunked_docs
\ No newline at end of file
+        return chunked_docs
@@ -0,0 +1,156 @@
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+import numpy as np
+from typing import List, Dict, Any, Iterator, Tuple
+from src.config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES
+from src.ingestion.file_lock import file_lock
+
+class EmbeddingCache:
+    """On-disk embedding cache keyed by a 64-bit hash of (model name, text)
+
+    Vectors live in a memory-mapped float32 .npy matrix with one row per slot;
+    a compact (key, slot, last_used) table maps hashes to rows. When the cache
+    is full, the least recently used entries are evicted.
+
+    The files may be shared by several processes: writers hold lock(), which
+    also reloads the table if another process flushed one meanwhile.
+    """
+
+    EVICT_FRACTION = 0.1  # Evict at least this share of capacity at once
+
+    def __init__(self, model_name: str, dim: int,
+                 path: str = EMBEDDING_CACHE_PATH,
+                 max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.model_name = model_name
+        self.dim = dim
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        """Open the cache files, starting fresh if missing or incompatible"""
+        vectors_path = f"{self.path}.vectors.npy"
+        table_path = f"{self.path}.table.npz"
+        try:
+            table = np.load(table_path)
+            if (str(table["model"]) != self.model_name or int(table["dim"]) != self.dim
+                    or int(table["capacity"]) != self.max_entries):
+                raise ValueError("Embedding cache was built for a different model/size")
+            self.vectors = np.load(vectors_path, mmap_mode="r+")
+            self.slots = dict(zip(table["keys"].tolist(), table["slots"].tolist()))
+            self.last_used = table["last_used"]
+            self.tick = int(self.last_used.max(initial=0))
+            self._table_mtime = os.stat(table_path).st_mtime_ns
+        except (OSError, KeyError, ValueError):
+            self.vectors = np.lib.format.open_memmap(
+                vectors_path, mode="w+", dtype=np.float32, shape=(self.max_entries, self.dim)
+            )
+            self.slots = {}
+            self.last_used = np.zeros(self.max_entries, dtype=np.int64)
+            self.tick = 0
+            self._table_mtime = None
+
+        used = np.zeros(self.max_entries, dtype=bool)
+        used[list(self.slots.values())] = True
+        self.free_slots = np.flatnonzero(~used).tolist()
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Hold the cache's cross-process lock, picking up entries other processes flushed"""
+        with file_lock(f"{self.path}.lock"):
+            with self._lock:
+                try:
+                    mtime = os.stat(f"{self.path}.table.npz").st_mtime_ns
+                except OSError:
+                    mtime = None
+                if mtime != self._table_mtime:
+                    self._open()
+            yield
+
+    def _key(self, text: str) -> int:
+        digest = hashlib.blake2b(f"{self.model_name}\0{text}".encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little")
+
+    def get_many(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """Look up texts; returns an (n, dim) matrix and the positions that missed"""
+        result = np.zeros((len(texts), self.dim), dtype=np.float32)
+        missing = []
+        with self._lock:
+            self.tick += 1
+            hit_positions, hit_slots = [], []
+            for position, text in enumerate(texts):
+                slot = self.slots.get(self._key(text))
+                if slot is None:
+                    missing.append(position)
+                else:
+                    hit_positions.append(position)
+                    hit_slots.append(slot)
+
+            if hit_slots:
+                result[hit_positions] = self.vectors[hit_slots]
+                self.last_used[hit_slots] = self.tick
+            self.hits += len(hit_slots)
+            self.misses += len(missing)
+        return result, missing
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """Store vectors for texts, evicting least recently used entries if full"""
+        # A batch larger than the cache can only keep its tail
+        texts, vectors = texts[-self.max_entries:], vectors[-self.max_entries:]
+        with self._lock:
+            self.tick += 1
+            keys = [self._key(text) for text in texts]
+            new_keys = [key for key in dict.fromkeys(keys) if key not in self.slots]
+            if len(new_keys) > len(self.free_slots):
+                self._evict(len(new_keys) - len(self.free_slots), protected=set(keys))
+
+            for key in new_keys:
+                self.slots[key] = self.free_slots.pop()
+            slots = [self.slots[key] for key in keys]
+            self.vectors[slots] = vectors
+            self.last_used[slots] = self.tick
+
+    def _evict(self, needed: int, protected: set):
+        """Free at least `needed` slots, oldest first"""
+        count = max(needed, int(self.max_entries * self.EVICT_FRACTION))
+        candidates = [(key, slot) for key, slot in self.slots.items() if key not in protected]
+        if not candidates:
+            return
+        count = min(count, len(candidates))
+        ages = self.last_used[[slot for _, slot in candidates]]
+        for i in np.argpartition(ages, count - 1)[:count]:
+            key, slot = candidates[i]
+            del self.slots[key]
+            self.free_slots.append(slot)
+        self.evictions += count
+
+    def flush(self):
+        """Persist vectors and the hash table (table written atomically)"""
+        with self._lock:
+            self.vectors.flush()
+            keys = np.fromiter(self.slots.keys(), dtype=np.uint64, count=len(self.slots))
+            slots = np.fromiter(self.slots.values(), dtype=np.int64, count=len(self.slots))
+            tmp_path = f"{self.path}.table.tmp.npz"
+            np.savez(
+                tmp_path, keys=keys, slots=slots, last_used=self.last_used,
+                model=self.model_name, dim=self.dim, capacity=self.max_entries
+            )
+            os.replace(tmp_path, f"{self.path}.table.npz")
+            self._table_mtime = os.stat(f"{self.path}.table.npz").st_mtime_ns
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.slots),
+            "capacity": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,152 @@
+import json
+import os
+import numpy as np
+from typing import List, Dict, Any
+from src.config import (
+    EMBEDDING_MODEL, EMBEDDING_BACKEND, ONNX_MODEL_DIR, ONNX_NUM_THREADS, ONNX_PARITY_TOLERANCE
+)
+
+ENCODER_BACKENDS = ("torch", "onnx")
+
+PARITY_SENTENCES = [
+    "How many sick days do I get per year?",
+    "What is the expense limit for client dinners?",
+    "Can I work from home on Fridays?",
+    "Does dental insurance cover root canals?",
+    "Please submit form W-4 to payroll before your first pay date.",
+]
+
+class TorchEncoder:
+    """SentenceTransformer (PyTorch) backend, the default"""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.name = model_name
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, convert_to_numpy=True)
+
+class OnnxEncoder:
+    """Int8-quantized ONNX Runtime backend for CPU inference
+
+    Runs the same transformer as TorchEncoder, exported once to ONNX_MODEL_DIR,
+    followed by the model's pooling step in NumPy.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, model_dir: str = ONNX_MODEL_DIR,
+                 num_threads: int = ONNX_NUM_THREADS):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError("EMBEDDING_BACKEND=onnx requires the 'onnxruntime' package") from e
+
+        if not os.path.exists(os.path.join(model_dir, "model.int8.onnx")):
+            export_onnx(model_name, model_dir)
+
+        with open(os.path.join(model_dir, "encoder.json"), "r", encoding="utf-8") as f:
+            config = json.load(f)
+        if config["model"] != model_name:
+            raise ValueError(f"{model_dir} holds an export of {config['model']}, not {model_name}")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, "model.int8.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = config["max_seq_length"]
+        self.pooling = config["pooling"]
+        self.normalize = config["normalize"]
+        self.name = f"{model_name}#onnx-int8"
+        self.dim = config["dim"]
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np"
+        )
+        feed = {name: inputs[name].astype(np.int64) for name in self.input_names}
+        token_embeddings = self.session.run(None, feed)[0]
+
+        if self.pooling == "cls":
+            embeddings = token_embeddings[:, 0]
+        else:
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if self.normalize:
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True).clip(1e-12)
+        return embeddings.astype(np.float32)
+
+def export_onnx(model_name: str = EMBEDDING_MODEL, model_dir: str = ONNX_MODEL_DIR):
+    """Export the SentenceTransformer's transformer to ONNX and quantize its weights to int8"""
+    import torch
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from sentence_transformers import SentenceTransformer
+
+    print(f"📦 Exporting {model_name} to ONNX in {model_dir}")
+    os.makedirs(model_dir, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    pooling = st_model[1]
+
+    sample = st_model.tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+            opset_version=14
+        )
+    quantize_dynamic(fp32_path, os.path.join(model_dir, "model.int8.onnx"), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+
+    st_model.tokenizer.save_pretrained(model_dir)
+    with open(os.path.join(model_dir, "encoder.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "model": model_name,
+            "dim": st_model.get_sentence_embedding_dimension(),
+            "max_seq_length": st_model.max_seq_length,
+            "pooling": "cls" if pooling.pooling_mode_cls_token else "mean",
+            "normalize": any(type(module).__name__ == "Normalize" for module in st_model)
+        }, f)
+
+    report = check_parity(TorchEncoder(model_name), OnnxEncoder(model_name, model_dir))
+    print(f"✅ ONNX export done, parity: {report}")
+    return report
+
+def check_parity(reference, candidate, texts: List[str] = PARITY_SENTENCES,
+                 tolerance: float = ONNX_PARITY_TOLERANCE) -> Dict[str, Any]:
+    """Cosine similarity between two backends' embeddings of the same texts"""
+    a, b = reference.encode(texts), candidate.encode(texts)
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    cosine = (a * b).sum(axis=1)
+    report = {
+        "texts": len(texts),
+        "mean_cosine": float(cosine.mean()),
+        "min_cosine": float(cosine.min()),
+        "tolerance": tolerance,
+        "passed": bool(cosine.min() >= tolerance)
+    }
+    if not report["passed"]:
+        print(f"⚠️ Encoder parity below tolerance: {report}")
+    return report
+
+def get_encoder(backend: str = EMBEDDING_BACKEND):
+    """Create the configured encoder backend"""
+    if backend == "onnx":
+        return OnnxEncoder()
+    if backend == "torch":
+        return TorchEncoder()
+    raise ValueError(f"Unknown encoder backend '{backend}', expected one of {ENCODER_BACKENDS}")
@@ -0,0 +1,27 @@
+import os
+from contextlib import contextmanager
+from typing import Iterator
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, locks are no-ops
+    fcntl = None
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Hold an exclusive advisory lock on path (created if missing) for the block
+
+    Serializes writers across processes (API workers, CLI ingestion) as well
+    as threads. flock locks belong to an open file, so a thread must not take
+    a lock it already holds: the second open would wait on the first forever.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,125 @@
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+from src.config import INGEST_JOB_HISTORY
+
+JOB_STATES = ("queued", "running", "succeeded", "failed")
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+class IngestionJob:
+    """One requested ingestion run of a namespace, with live progress and its result"""
+
+    def __init__(self, namespace: str, full_rebuild: bool = False):
+        self.id = uuid.uuid4().hex[:12]
+        self.namespace = namespace
+        self.full_rebuild = full_rebuild
+        self.state = "queued"
+        self.requests = 1  # /ingest calls coalesced into this job
+        self.created_at = _now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.progress: Dict[str, Any] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+
+    def update(self, progress: Dict[str, Any]):
+        self.progress = {**self.progress, **progress}
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or _now()
+        stats = (self.result or {}).get("pipeline_stats") or self.progress.get("pipeline_stats") or {}
+        return {
+            "job_id": self.id,
+            "namespace": self.namespace,
+            "full_rebuild": self.full_rebuild,
+            "state": self.state,
+            "requests": self.requests,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round((end - self.started_at).total_seconds(), 3) if self.started_at else None,
+            "embeddings_per_second": stats.get("embed", {}).get("items_per_second"),
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error
+        }
+
+class JobManager:
+    """Runs ingestion jobs one at a time on a single worker thread
+
+    Only one ingestion of this process mutates the stores at any time (other
+    processes are kept out by the store's build lock). A request for a
+    namespace that already has a job waiting in the queue joins that job
+    instead of queueing another (it would scan the same files); a running
+    job does not absorb new requests, since files may have changed since it
+    scanned them. The last max_history finished jobs are kept for lookup.
+    """
+
+    def __init__(self, run: Callable[..., Dict[str, Any]], max_history: int = INGEST_JOB_HISTORY):
+        self.run = run  # run_ingestion(full_rebuild=, namespace=, progress=)
+        self.max_history = max_history
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queue: "queue.Queue[IngestionJob]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self.coalesced = 0
+
+    def submit(self, namespace: str, full_rebuild: bool = False) -> Tuple[IngestionJob, bool]:
+        """Queue an ingestion of a namespace; returns the job and whether it joined a queued one"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.state == "queued" and job.namespace == namespace:
+                    job.full_rebuild = job.full_rebuild or full_rebuild
+                    job.requests += 1
+                    self.coalesced += 1
+                    return job, True
+
+            job = IngestionJob(namespace, full_rebuild)
+            self._jobs[job.id] = job
+            self._prune()
+            self._queue.put(job)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name="ingestion-jobs", daemon=True)
+                self._worker.start()
+            return job, False
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.state in ("succeeded", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                job.state = "running"
+                job.started_at = _now()
+            try:
+                result = self.run(full_rebuild=job.full_rebuild, namespace=job.namespace, progress=job.update)
+                job.result = result
+                job.state = "failed" if result.get("status") == "error" else "succeeded"
+                if job.state == "failed":
+                    job.error = result.get("message")
+            except Exception as e:
+                job.state, job.error = "failed", str(e)
+            job.finished_at = _now()
+            with self._lock:
+                self._prune()
+            print(f"{'✅' if job.state == 'succeeded' else '❌'} Ingestion job {job.id} ({job.namespace}) {job.state}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+        return {
+            **{state: states.count(state) for state in JOB_STATES},
+            "coalesced_requests": self.coalesced
+        }
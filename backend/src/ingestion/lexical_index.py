@@ -0,0 +1,161 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+import numpy as np
+from typing import List, Iterable, Optional, Tuple
+from src.config import BM25_K1, BM25_B
+from src.ingestion.chunk_store import load_array
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-'.][a-z0-9]+)*")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; keeps codes like "401k", "w-4" and "fmla" intact"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    """Compact in-process BM25 inverted index over chunk texts
+
+    Postings are stored CSR-style: for term t, rows[offsets[t]:offsets[t + 1]]
+    are the chunk rows containing it and tfs[...] the term frequencies. Rows are
+    aligned with the chunk store, and ids maps a row back to its chunk ID.
+    """
+
+    def __init__(self, vocab: List[str], offsets: np.ndarray, rows: np.ndarray,
+                 tfs: np.ndarray, doc_len: np.ndarray, ids: np.ndarray):
+        self.vocab = vocab
+        self.term_ids = {term: tid for tid, term in enumerate(vocab)}
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.ids = ids
+        self.avgdl = float(doc_len.mean()) if len(doc_len) else 0.0
+
+    @staticmethod
+    def _postings(texts: Iterable[str], term_ids: dict, vocab: List[str]):
+        """Tokenize texts into (term, row, tf) posting arrays, extending the vocabulary"""
+        terms, rows, tfs, doc_len = [], [], [], []
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                tid = term_ids.get(term)
+                if tid is None:
+                    tid = term_ids[term] = len(vocab)
+                    vocab.append(term)
+                terms.append(tid)
+                rows.append(row)
+                tfs.append(tf)
+        return (np.array(terms, dtype=np.int32), np.array(rows, dtype=np.int32),
+                np.array(tfs, dtype=np.float32), np.array(doc_len, dtype=np.float32))
+
+    @classmethod
+    def _from_postings(cls, vocab: List[str], terms: np.ndarray, rows: np.ndarray,
+                       tfs: np.ndarray, doc_len: np.ndarray, ids: np.ndarray) -> "BM25Index":
+        order = np.argsort(terms, kind="stable")
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocab)), out=offsets[1:])
+        return cls(vocab, offsets, rows[order], tfs[order], doc_len, np.asarray(ids, dtype=np.int64))
+
+    @classmethod
+    def build(cls, ids: np.ndarray, texts: Iterable[str]) -> "BM25Index":
+        """Build from chunk IDs and their texts (same order as the chunk store rows)"""
+        builder = BM25Builder()
+        builder.add(ids, texts)
+        return builder.finish()
+
+    def search(self, query: str, k: int, row_mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k BM25 (scores, chunk IDs) for a query; row_mask restricts eligible rows"""
+        tids = {self.term_ids[term] for term in tokenize(query) if term in self.term_ids}
+        if not tids or not len(self.ids):
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        num_docs = len(self.ids)
+        row_parts, weight_parts = [], []
+        for tid in tids:
+            start, end = self.offsets[tid], self.offsets[tid + 1]
+            rows, tf = self.rows[start:end], self.tfs[start:end]
+            df = end - start
+            idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[rows] / self.avgdl)
+            row_parts.append(rows)
+            weight_parts.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+
+        # Sum contributions per matching row (cost scales with postings, not corpus size)
+        rows, inverse = np.unique(np.concatenate(row_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weight_parts))
+        if row_mask is not None:
+            allowed = row_mask[rows]
+            rows, scores = rows[allowed], scores[allowed]
+
+        top = np.argsort(-scores, kind="stable")[:k]
+        return scores[top].astype(np.float32), np.asarray(self.ids)[rows[top]]
+
+    def save(self, path: str):
+        for name, array in (("offsets", self.offsets), ("rows", self.rows), ("tfs", self.tfs),
+                            ("doc_len", self.doc_len), ("ids", self.ids)):
+            np.save(f"{path}.{name}.npy", array)
+        with open(f"{path}.vocab.json", "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(f"{path}.vocab.json", "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+        return cls(vocab, *(load_array(f"{path}.{name}.npy")
+                            for name in ("offsets", "rows", "tfs", "doc_len", "ids")))
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(f"{path}.vocab.json")
+
+class BM25Builder:
+    """Accumulates BM25 postings batch by batch, optionally on top of an existing index
+
+    Each batch is tokenized once and kept only as compact posting arrays, so
+    chunk texts can be dropped as soon as they are added.
+    """
+
+    def __init__(self, base: Optional[BM25Index] = None):
+        self.base = base
+        self.vocab = list(base.vocab) if base is not None else []
+        self.term_ids = dict(base.term_ids) if base is not None else {}
+        self._parts = []  # (terms, rows, tfs, doc_len, ids) per batch, rows counted from the first added chunk
+        self.num_added = 0
+
+    def add(self, ids: np.ndarray, texts: Iterable[str]):
+        terms, rows, tfs, doc_len = BM25Index._postings(texts, self.term_ids, self.vocab)
+        self._parts.append((terms, rows + self.num_added, tfs, doc_len, np.asarray(ids, dtype=np.int64)))
+        self.num_added += len(doc_len)
+
+    def finish(self, removed_ids: Iterable[int] = ()) -> BM25Index:
+        """The index over the base's remaining chunks followed by all added ones"""
+        terms = [np.zeros(0, dtype=np.int32)]
+        rows = [np.zeros(0, dtype=np.int32)]
+        tfs = [np.zeros(0, dtype=np.float32)]
+        doc_len = [np.zeros(0, dtype=np.float32)]
+        ids = [np.zeros(0, dtype=np.int64)]
+        num_kept = 0
+        if self.base is not None:
+            base = self.base
+            keep = ~np.isin(base.ids, np.fromiter(removed_ids, dtype=np.int64))
+            new_row = np.cumsum(keep) - 1
+            kept = keep[base.rows]
+            terms.append(np.repeat(np.arange(len(base.vocab), dtype=np.int32), np.diff(base.offsets))[kept])
+            rows.append(new_row[base.rows[kept]])
+            tfs.append(np.asarray(base.tfs)[kept])
+            doc_len.append(np.asarray(base.doc_len)[keep])
+            ids.append(np.asarray(base.ids)[keep])
+            num_kept = int(keep.sum())
+        for part_terms, part_rows, part_tfs, part_len, part_ids in self._parts:
+            terms.append(part_terms)
+            rows.append(part_rows + num_kept)
+            tfs.append(part_tfs)
+            doc_len.append(part_len)
+            ids.append(part_ids)
+        return BM25Index._from_postings(
+            self.vocab, np.concatenate(terms), np.concatenate(rows).astype(np.int32),
+            np.concatenate(tfs), np.concatenate(doc_len), np.concatenate(ids)
+        )
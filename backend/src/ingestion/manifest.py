@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+from typing import List, Dict, Any, Iterable
+from src.config import INGESTION_MANIFEST_PATH
+
+class IngestionManifest:
+    """Persisted record of ingested files: content hash, mtime, size and chunk IDs"""
+
+    def __init__(self, path: str = INGESTION_MANIFEST_PATH):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def file_hash(file_path: str) -> str:
+        """SHA-256 of the file contents, streamed in 1 MB blocks"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def load(self) -> bool:
+        """Load the manifest from disk; returns False if none exists"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.files = json.load(f)["files"]
+            return True
+        except (OSError, ValueError, KeyError):
+            self.files = {}
+            return False
+
+    def save(self):
+        """Write the manifest atomically so a crash never leaves it half-written"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f)
+        os.replace(tmp_path, self.path)
+
+    def diff(self, directory_path: str, rel_paths: List[str]) -> Dict[str, List[str]]:
+        """Classify files as added, updated, removed or unchanged
+
+        mtime and size are checked first; the file is only hashed when they differ,
+        and a matching hash (e.g. after a `touch`) still counts as unchanged.
+        """
+        changes = {"added": [], "updated": [], "removed": [], "unchanged": []}
+
+        for rel_path in rel_paths:
+            entry = self.files.get(rel_path)
+            if entry is None:
+                changes["added"].append(rel_path)
+                continue
+
+            stat = os.stat(os.path.join(directory_path, rel_path))
+            if stat.st_mtime == entry["mtime"] and stat.st_size == entry["size"]:
+                changes["unchanged"].append(rel_path)
+            elif self.file_hash(os.path.join(directory_path, rel_path)) == entry["hash"]:
+                entry["mtime"] = stat.st_mtime
+                changes["unchanged"].append(rel_path)
+            else:
+                changes["updated"].append(rel_path)
+
+        present = set(rel_paths)
+        changes["removed"] = [rel_path for rel_path in self.files if rel_path not in present]
+        return changes
+
+    def record(self, directory_path: str, rel_path: str, chunk_ids: List[int], aliases: Iterable[int] = ()):
+        """Record a freshly ingested file, the chunk IDs it produced and those of
+        other chunks its near-duplicate chunks were folded into"""
+        file_path = os.path.join(directory_path, rel_path)
+        stat = os.stat(file_path)
+        self.files[rel_path] = {
+            "hash": self.file_hash(file_path),
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "chunk_ids": [int(chunk_id) for chunk_id in chunk_ids]
+        }
+        if aliases:
+            self.files[rel_path]["aliases"] = sorted({int(chunk_id) for chunk_id in aliases})
+
+    def dependents(self, chunk_ids: Iterable[int]) -> List[str]:
+        """Files with near-duplicate chunks folded into any of the given chunks"""
+        chunk_ids = set(chunk_ids)
+        return [rel_path for rel_path, entry in self.files.items()
+                if not chunk_ids.isdisjoint(entry.get("aliases", ()))]
+
+    def invalidate(self, rel_path: str):
+        """Make the next diff report a file as updated, so it is re-ingested"""
+        if rel_path in self.files:
+            self.files[rel_path].update(hash="", mtime=0, size=-1)
+
+    def forget(self, rel_path: str) -> List[int]:
+        """Drop a file from the manifest, returning the chunk IDs it owned"""
+        entry = self.files.pop(rel_path, None)
+        return entry["chunk_ids"] if entry else []
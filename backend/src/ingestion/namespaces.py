@@ -0,0 +1,111 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional
+from src.config import (
+    DOCUMENTS_DIR, VECTOR_STORE_PATH, NAMESPACES_DIR, DEFAULT_NAMESPACE, MAX_RESIDENT_NAMESPACES
+)
+from src.ingestion.encoders import get_encoder
+from src.ingestion.vector_store import VectorStore
+
+NAMESPACE_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+# Namespace of the request being served; PolicySearch searches this namespace's index
+current_namespace: ContextVar[str] = ContextVar("current_namespace", default=DEFAULT_NAMESPACE)
+
+class NamespaceRegistry:
+    """Per-namespace vector stores with LRU residency
+
+    The default namespace is always resident. Other namespaces are loaded from
+    disk on first use and evicted least-recently-used once more than
+    max_resident are in memory; an evicted namespace is simply reloaded on its
+    next request. All stores share one encoder and embedding cache.
+    """
+
+    def __init__(self, max_resident: int = MAX_RESIDENT_NAMESPACES):
+        self.max_resident = max_resident
+        self.encoder = get_encoder()
+        self.default = VectorStore(encoder=self.encoder)
+        self._resident: "OrderedDict[str, VectorStore]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def documents_dir(self, name: str) -> str:
+        if name == DEFAULT_NAMESPACE:
+            return DOCUMENTS_DIR
+        return os.path.join(NAMESPACES_DIR, name, "documents")
+
+    def store_path(self, name: str) -> str:
+        if name == DEFAULT_NAMESPACE:
+            return VECTOR_STORE_PATH
+        return os.path.join(NAMESPACES_DIR, name, "faiss_index")
+
+    def resolve(self, name: Optional[str]) -> str:
+        """Validate a requested namespace (None = default) and return its name"""
+        name = name or DEFAULT_NAMESPACE
+        if name == DEFAULT_NAMESPACE:
+            return name
+        if not NAMESPACE_PATTERN.match(name):
+            raise ValueError(f"Invalid namespace '{name}': use lowercase letters, digits, '-' and '_'")
+        if not os.path.isdir(os.path.join(NAMESPACES_DIR, name)):
+            raise ValueError(f"Unknown namespace '{name}'")
+        return name
+
+    def get(self, name: Optional[str] = None) -> VectorStore:
+        """The vector store of a namespace, loading it (and evicting the LRU one) if needed"""
+        name = self.resolve(name)
+        if name == DEFAULT_NAMESPACE:
+            return self.default
+
+        with self._lock:
+            store = self._resident.get(name)
+            if store is not None:
+                self._resident.move_to_end(name)
+                return store
+
+        # Load outside the lock so other namespaces stay available meanwhile
+        store = VectorStore(encoder=self.encoder, path=self.store_path(name),
+                            embedding_cache=self.default.embedding_cache)
+        if store.load():
+            print(f"✅ Loaded namespace '{name}'")
+
+        with self._lock:
+            if name in self._resident:  # Another request loaded it first
+                self._resident.move_to_end(name)
+                return self._resident[name]
+            self._resident[name] = store
+            self.loads += 1
+            while len(self._resident) > self.max_resident:
+                evicted, _ = self._resident.popitem(last=False)
+                self.evictions += 1
+                print(f"♻️ Evicted namespace '{evicted}' from memory")
+            return store
+
+    def resident(self, name: str) -> Optional[VectorStore]:
+        """The in-memory store of a namespace, without loading it"""
+        if name == DEFAULT_NAMESPACE:
+            return self.default
+        with self._lock:
+            return self._resident.get(name)
+
+    def names(self) -> List[str]:
+        """All namespaces on disk, default first"""
+        names = []
+        if os.path.isdir(NAMESPACES_DIR):
+            names = sorted(name for name in os.listdir(NAMESPACES_DIR)
+                           if NAMESPACE_PATTERN.match(name) and os.path.isdir(os.path.join(NAMESPACES_DIR, name)))
+        return [DEFAULT_NAMESPACE] + [name for name in names if name != DEFAULT_NAMESPACE]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            resident = list(self._resident)
+        return {
+            "namespaces": len(self.names()),
+            "resident": [DEFAULT_NAMESPACE] + resident,
+            "max_resident": self.max_resident,
+            "loads": self.loads,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,230 @@
+import queue
+import threading
+import time
+import numpy as np
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional
+from src.config import EMBED_BATCH_SIZE, PIPELINE_QUEUE_SIZE
+from src.ingestion.document_loader import DocumentLoader
+from src.ingestion.dedup import NearDuplicateIndex, minhashes, group_of
+
+_DONE = object()
+
+class StageStats:
+    """Items processed and seconds spent working (not waiting) by one pipeline stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "seconds": round(self.seconds, 3),
+            "items_per_second": round(self.items / self.seconds, 1) if self.seconds else None
+        }
+
+def _background(iterable: Iterable, maxsize: int) -> Iterator:
+    """Run a generator in its own thread, handing items over through a bounded queue
+
+    The producer blocks once maxsize items are waiting, which is what bounds
+    memory between stages. Exceptions are re-raised in the consumer; closing
+    the returned iterator early makes the producer stop and close its
+    generator, so e.g. loader processes are cleaned up.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put(item):
+                    break
+            put(_DONE)
+        except BaseException as e:
+            put(e)
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+class IngestionPipeline:
+    """Streams documents through load -> chunk -> (dedup ->) embed -> index stages
+
+    Each stage runs in its own thread, connected by queues holding at most
+    queue_size documents or batches, and chunks are embedded and added to the
+    snapshot builder batch_size at a time. Peak memory is therefore a few
+    documents plus a few batches, whatever the corpus size; only what the
+    index itself keeps (vectors, postings, chunk IDs) grows with the corpus.
+
+    With a NearDuplicateIndex, chunks that nearly duplicate an indexed (or
+    earlier) chunk are dropped before embedding and recorded as aliases.
+    """
+
+    def __init__(self, store, loader: DocumentLoader = None,
+                 batch_size: int = EMBED_BATCH_SIZE, queue_size: int = PIPELINE_QUEUE_SIZE):
+        self.store = store
+        self.loader = loader or DocumentLoader()
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+    def run(self, documents_dir: str, rel_paths: List[str], builder,
+            progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+            dedup: Optional[NearDuplicateIndex] = None) -> Dict[str, Any]:
+        """Load, chunk, embed and add files to a SnapshotBuilder
+
+        Returns the chunk IDs assigned per loaded file (in load order), the
+        files that failed to load and per-stage throughput. The builder is
+        not finished, so the caller decides what to remove. progress, if
+        given, is called with running counts after every indexed batch.
+
+        With dedup, also returns "aliases" (per file, the IDs of the kept
+        chunks its dropped chunks duplicate) and "duplicates" (per kept chunk
+        ID, the sources of its dropped duplicates). Kept chunks are assigned
+        IDs ahead of indexing, so the builder must receive only this run's chunks.
+        """
+        names = ("load", "chunk", "dedup", "embed", "index") if dedup is not None else ("load", "chunk", "embed", "index")
+        stages = {name: StageStats(name) for name in names}
+        chunk_ids: Dict[str, List[int]] = {}
+        aliases: Dict[str, List[int]] = {}
+        duplicates: Dict[int, List[Dict[str, Any]]] = {}
+        files_failed = []
+        chunks_deduplicated = 0  # Counted by the dedup thread: progress must not iterate aliases
+        started = time.perf_counter()
+        
+        def stats() -> Dict[str, Any]:
+            report = {name: stage.to_dict() for name, stage in stages.items()}
+            report["total_seconds"] = round(time.perf_counter() - started, 3)
+            return report
+
+        def load():
+            documents = iter(self.loader.iter_load_files(documents_dir, rel_paths))
+            try:
+                while True:
+                    tick = time.perf_counter()
+                    try:
+                        rel_path, document, error = next(documents)
+                    except StopIteration:
+                        break
+                    finally:
+                        stages["load"].seconds += time.perf_counter() - tick
+                    if error:
+                        print(f"⚠️ Skipping {rel_path}: {error}")
+                        files_failed.append({"file": rel_path, "error": error})
+                        continue
+                    stages["load"].items += 1
+                    yield rel_path, document
+            finally:
+                documents.close()
+
+        def chunk(documents):
+            for rel_path, document in documents:
+                tick = time.perf_counter()
+                try:
+                    # Pages are parsed (or received from a loader process) as they are chunked
+                    chunks = self.loader.chunk_documents([document])
+                except Exception as e:
+                    print(f"⚠️ Skipping {rel_path}: {e}")
+                    files_failed.append({"file": rel_path, "error": str(e)})
+                    continue
+                finally:
+                    stages["chunk"].seconds += time.perf_counter() - tick
+                stages["chunk"].items += len(chunks)
+                chunk_ids[rel_path] = []
+                yield rel_path, chunks, None
+
+        def deduplicate(chunked):
+            nonlocal chunks_deduplicated
+            next_id = builder.next_id
+            for rel_path, chunks, _ in chunked:
+                tick = time.perf_counter()
+                kept, signatures = [], []
+                for chunk, signature in zip(chunks, minhashes(chunk["text"] for chunk in chunks)):
+                    group = group_of(chunk["metadata"])
+                    canonical, _ = dedup.find(signature, group)
+                    if canonical is None:
+                        dedup.add([next_id], signature[None], [group])
+                        next_id += 1
+                        kept.append(chunk)
+                        signatures.append(signature)
+                        continue
+                    metadata = chunk["metadata"]
+                    aliases.setdefault(rel_path, []).append(canonical)
+                    chunks_deduplicated += 1
+                    duplicates.setdefault(canonical, []).append(
+                        {field: metadata[field] for field in ("source", "path", "page", "type") if field in metadata})
+                stages["dedup"].seconds += time.perf_counter() - tick
+                stages["dedup"].items += len(chunks)
+                yield rel_path, kept, minhashes([]) if not signatures else np.array(signatures)
+
+        def embed(chunked):
+            pending = []  # (rel_path, chunk, signature or None) not yet embedded
+
+            def embed_batch(batch):
+                tick = time.perf_counter()
+                embeddings = self.store.create_embeddings([chunk["text"] for _, chunk, _ in batch])
+                stages["embed"].seconds += time.perf_counter() - tick
+                stages["embed"].items += len(batch)
+                return batch, embeddings
+
+            for rel_path, chunks, signatures in chunked:
+                pending.extend((rel_path, chunk, signatures[i] if signatures is not None else None)
+                               for i, chunk in enumerate(chunks))
+                while len(pending) >= self.batch_size:
+                    yield embed_batch(pending[:self.batch_size])
+                    pending = pending[self.batch_size:]
+            if pending:
+                yield embed_batch(pending)
+
+        documents = _background(load(), self.queue_size)
+        chunked = _background(chunk(documents), self.queue_size)
+        deduplicated = _background(deduplicate(chunked), self.queue_size) if dedup is not None else chunked
+        embedded = _background(embed(deduplicated), self.queue_size)
+        try:
+            for batch, embeddings in embedded:
+                tick = time.perf_counter()
+                signatures = np.array([signature for _, _, signature in batch]) if dedup is not None else None
+                ids = builder.add([chunk for _, chunk, _ in batch], embeddings, signatures)
+                for (rel_path, _, _), doc_id in zip(batch, ids):
+                    chunk_ids[rel_path].append(doc_id)
+                stages["index"].seconds += time.perf_counter() - tick
+                stages["index"].items += len(batch)
+                if progress:
+                    progress({
+                        "files_total": len(rel_paths),
+                        "files_loaded": stages["load"].items,
+                        "files_failed": len(files_failed),
+                        "chunks_indexed": stages["index"].items,
+                        "chunks_deduplicated": chunks_deduplicated,
+                        "pipeline_stats": stats()
+                    })
+        finally:
+            # Downstream first: each close waits for that stage's thread to exit
+            for stage in (embedded, deduplicated, chunked, documents):
+                stage.close()
+
+        return {"chunk_ids": chunk_ids, "aliases": aliases, "duplicates": duplicates,
+                "files_failed": files_failed, "stats": stats()}
@@ -1,78 +1,900 @@
+import json
+import os
 import pickle
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 import numpy as np
-from typing import List, Dict, Any, Optional
-from sentence_transformers import SentenceTransformer
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import faiss
-from src.config import VECTOR_STORE_PATH, EMBEDDING_MODEL
+from src.config import (
+    VECTOR_STORE_PATH, INDEX_TYPE,
+    HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, IVF_NLIST, IVF_NPROBE,
+    PQ_M, PQ_NBITS, RERANK_FACTOR, INDEX_TRAIN_SAMPLE, SEARCH_MODE, HYBRID_CANDIDATES, RRF_K, MMR_CANDIDATES,
+    TOMBSTONE_COMPACT_FRACTION, EMBEDDING_CACHE_ENABLED, SNAPSHOTS_TO_KEEP, FILTER_FIELDS,
+    FILTER_BITMAP_MAX_VALUES, DEFAULT_DEPARTMENT
+)
+from src.ingestion.embedding_cache import EmbeddingCache
+from src.ingestion.file_lock import file_lock
+from src.ingestion.encoders import get_encoder
+from src.ingestion.chunk_store import ChunkStore, ChunkStoreWriter, FILE_SUFFIXES, load_array
+from src.ingestion.lexical_index import BM25Index, BM25Builder
+from src.ingestion.diversify import mmr_order, collapse_adjacent
+from src.ingestion.dedup import NearDuplicateIndex, minhashes, group_of
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "sq8", "pq")
+SEARCH_MODES = ("dense", "lexical", "hybrid")
+
+class IndexSnapshot:
+    """An immutable (index, chunk store, BM25 index) triple with a version
+
+    Searches grab one snapshot reference and use it throughout, so replacing
+    the active snapshot never exposes an index that disagrees with its chunks.
+
+    Metadata filters are answered from tag_ids, the chunk IDs of each (field,
+    value) of FILTER_FIELDS. Fields with at most FILTER_BITMAP_MAX_VALUES values
+    also keep tag_bitmaps, packed bitmaps over chunk IDs (bit i of byte i >> 3
+    is ID i, little-endian bit order, as faiss.IDSelectorBitmap expects); the
+    others (e.g. source) get their bitmap built per query from the IDs.
+
+    signatures holds the MinHash signature of every row (None if any chunk
+    was added without one) and duplicates maps a chunk ID to the other sources
+    ({"source", "path", "page", "type"}) whose near-identical chunks were not
+    indexed. A chunk is also tagged with the source and type of each of those,
+    so filtering on a document finds the content folded into other chunks.
+
+    tombstones are the sorted IDs of removed chunks still in an index that
+    cannot delete (HNSW); live_bitmap (None without tombstones) excludes them
+    from every search.
+    """
+
+    def __init__(self, index, documents: ChunkStore, next_id: int,
+                 lexical: Optional[BM25Index] = None,
+                 version: Optional[str] = None, path: Optional[str] = None,
+                 signatures: Optional[np.ndarray] = None,
+                 duplicates: Optional[Dict[int, List[Dict[str, Any]]]] = None,
+                 tombstones: Optional[np.ndarray] = None):
+        self.index = index
+        self.documents = documents
+        self.tombstones = np.zeros(0, dtype=np.int64) if tombstones is None else np.asarray(tombstones, dtype=np.int64)
+        # Tombstoned IDs are never handed out again
+        self.next_id = max(next_id, int(self.tombstones[-1]) + 1 if len(self.tombstones) else 0)
+        self.lexical = lexical or BM25Index.build(documents.ids, documents.texts())
+        self.signatures = signatures
+        self.duplicates = duplicates or {}
+        self.version = version or f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.path = path  # Snapshot directory once published
+        self.tag_ids, self.tag_bitmaps = self._build_tags()
+        self.live_bitmap = None
+        if len(self.tombstones):
+            bits = np.ones(self.next_id, dtype=bool)
+            bits[self.tombstones] = False
+            self.live_bitmap = np.packbits(bits, bitorder="little")
+
+    def _build_tags(self) -> Tuple[Dict[Tuple[str, str], np.ndarray], Dict[Tuple[str, str], np.ndarray]]:
+        """Group chunk IDs by (filter field, lowercased value), with bitmaps for low-cardinality fields"""
+        ids = np.asarray(self.documents.ids)
+        # Chunks ingested before departments existed all came from top-level files
+        meta_table = [{"department": DEFAULT_DEPARTMENT, **m} for m in self.documents.meta_table]
+        tag_ids, bitmaps = {}, {}
+        for field in FILTER_FIELDS:
+            # Code the interned metadata table by value, then expand the codes to rows
+            values = sorted({str(m[field]).lower() for m in meta_table if field in m})
+            codes = {value: code for code, value in enumerate(values)}
+            table_codes = np.array(
+                [codes[str(m[field]).lower()] if field in m else -1 for m in meta_table],
+                dtype=np.int32
+            )
+            row_codes = table_codes[np.asarray(self.documents.meta_idx)]
+            # One sort groups the rows of every value (rows without the field sort first)
+            order = np.argsort(row_codes, kind="stable")
+            bounds = np.searchsorted(row_codes[order], np.arange(len(values) + 1))
+            for code, value in enumerate(values):
+                tag_ids[(field, value)] = ids[order[bounds[code]:bounds[code + 1]]]
+            folded = {}  # Value -> IDs of chunks standing in for a duplicate with that value
+            for doc_id, records in self.duplicates.items():
+                for record in records:
+                    value = record.get(field)
+                    if value is None and field == "type" and "source" in record:
+                        value = os.path.splitext(record["source"])[1].lstrip(".")  # Recorded without a type
+                    if value is not None:
+                        folded.setdefault(str(value).lower(), []).append(doc_id)
+            for value, doc_ids in folded.items():
+                own_ids = tag_ids.get((field, value), np.zeros(0, dtype=np.int64))
+                tag_ids[(field, value)] = np.union1d(own_ids, np.array(doc_ids, dtype=np.int64))
+            values = sorted({value for tag_field, value in tag_ids if tag_field == field})
+            if len(values) <= FILTER_BITMAP_MAX_VALUES:
+                for value in values:
+                    bitmaps[(field, value)] = self._ids_bitmap([tag_ids[(field, value)]])
+        return tag_ids, bitmaps
+
+    def _ids_bitmap(self, id_arrays: List[np.ndarray]) -> np.ndarray:
+        """Pack the union of chunk ID arrays into an ID bitmap"""
+        bits = np.zeros(self.next_id, dtype=bool)
+        for ids in id_arrays:
+            bits[ids] = True
+        return np.packbits(bits, bitorder="little")
+
+    def filter_bitmap(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Combine tags: values of one field are OR-ed, different fields AND-ed
+
+        filters maps a field to a value or a list of values, e.g.
+        {"department": "hr", "type": ["pdf", "docx"]}.
+        """
+        bitmap = (self.live_bitmap.copy() if self.live_bitmap is not None
+                  else np.full((self.next_id + 7) // 8, 0xFF, dtype=np.uint8))
+        for field, wanted in filters.items():
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Cannot filter on '{field}', expected one of {FILTER_FIELDS}")
+            field_bitmap = np.zeros_like(bitmap)
+            unpacked = []  # ID arrays of values without a precomputed bitmap
+            for value in ([wanted] if isinstance(wanted, str) else wanted):
+                key = (field, str(value).lower())
+                if key in self.tag_bitmaps:
+                    field_bitmap |= self.tag_bitmaps[key]
+                elif key in self.tag_ids:
+                    unpacked.append(self.tag_ids[key])
+            if unpacked:
+                field_bitmap |= self._ids_bitmap(unpacked)
+            bitmap &= field_bitmap
+        return bitmap
+
+    def row_mask(self, bitmap: np.ndarray) -> np.ndarray:
+        """Expand an ID bitmap to a boolean mask over chunk store rows"""
+        ids = np.asarray(self.documents.ids)
+        return ((bitmap[ids >> 3] >> (ids & 7)) & 1).astype(bool)
+
+    def supports_selector(self) -> bool:
+        """Whether FAISS can restrict searches on this index to an ID selector"""
+        return not isinstance(self.base_index(), faiss.IndexPQ)
+
+    def base_index(self):
+        """The underlying ANN index, unwrapped from its ID map"""
+        if isinstance(self.index, faiss.IndexIDMap2):
+            return faiss.downcast_index(self.index.index)
+        return self.index
+
+    def index_type(self) -> Optional[str]:
+        """Which of INDEX_TYPES the base index was built as (None for legacy L2 indexes)"""
+        base_index = self.base_index()
+        if isinstance(base_index, faiss.IndexHNSW):
+            return "hnsw"
+        if isinstance(base_index, faiss.IndexIVF):
+            return "ivf_flat"
+        if isinstance(base_index, faiss.IndexPQ):
+            return "pq"
+        if isinstance(base_index, faiss.IndexScalarQuantizer):
+            return "sq8"
+        if isinstance(base_index, faiss.IndexFlat) and base_index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            return "flat"
+        return None
+
+    def is_compressed(self) -> bool:
+        """Whether scores are approximate (quantized codes) and need exact re-ranking"""
+        return isinstance(self.base_index(), (faiss.IndexScalarQuantizer, faiss.IndexPQ))
+
+    def search_params(self, ef_search: Optional[int] = None, nprobe: Optional[int] = None,
+                      selector=None):
+        """Build per-query FAISS search parameters (None = use index defaults)
+
+        selector restricts the search to the chunk IDs it accepts.
+        """
+        base_index = self.base_index()
+        if isinstance(base_index, faiss.IndexHNSW) and (ef_search is not None or selector is not None):
+            return faiss.SearchParametersHNSW(
+                efSearch=ef_search if ef_search is not None else base_index.hnsw.efSearch, sel=selector
+            )
+        if isinstance(base_index, faiss.IndexIVF) and (nprobe is not None or selector is not None):
+            return faiss.SearchParametersIVF(
+                nprobe=nprobe if nprobe is not None else base_index.nprobe, sel=selector
+            )
+        if selector is not None:
+            return faiss.SearchParameters(sel=selector)
+        return None
+
+    def to_similarity(self, scores: np.ndarray) -> np.ndarray:
+        """Convert raw FAISS scores to similarities"""
+        if self.index.metric_type == faiss.METRIC_L2:
+            # Legacy IndexFlatL2 saved before cosine scoring was introduced
+            return 1 / (1 + scores)
+        return scores
+
+    def save(self, directory: str):
+        """Write the snapshot into a new directory (renamed into place when complete)"""
+        tmp_directory = f"{directory}.tmp"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+        faiss.write_index(self.index, os.path.join(tmp_directory, "index.faiss"))
+        self.documents.save(os.path.join(tmp_directory, "chunks"))
+        self.lexical.save(os.path.join(tmp_directory, "lexical"))
+        if self.signatures is not None:
+            np.save(os.path.join(tmp_directory, "minhash.npy"), self.signatures)
+        if self.duplicates:
+            with open(os.path.join(tmp_directory, "duplicates.json"), "w", encoding="utf-8") as f:
+                json.dump({str(doc_id): sources for doc_id, sources in self.duplicates.items()}, f)
+        if len(self.tombstones):
+            np.save(os.path.join(tmp_directory, "tombstones.npy"), self.tombstones)
+        os.rename(tmp_directory, directory)
+        self.path = directory
+        if self.documents.path:
+            self.documents.path = os.path.join(directory, "chunks")
+
+    @classmethod
+    def load(cls, directory: str, version: str) -> "IndexSnapshot":
+        documents = ChunkStore.load(os.path.join(directory, "chunks"))
+        lexical_path = os.path.join(directory, "lexical")
+        signatures_path = os.path.join(directory, "minhash.npy")
+        tombstones_path = os.path.join(directory, "tombstones.npy")
+        duplicates = {}
+        if os.path.exists(os.path.join(directory, "duplicates.json")):
+            with open(os.path.join(directory, "duplicates.json"), "r", encoding="utf-8") as f:
+                duplicates = {int(doc_id): sources for doc_id, sources in json.load(f).items()}
+        return cls(
+            faiss.read_index(os.path.join(directory, "index.faiss")),
+            documents,
+            int(documents.ids[-1]) + 1 if len(documents) else 0,
+            lexical=BM25Index.load(lexical_path) if BM25Index.exists(lexical_path) else None,
+            version=version,
+            path=directory,
+            signatures=load_array(signatures_path) if os.path.exists(signatures_path) else None,
+            duplicates=duplicates,
+            tombstones=np.load(tombstones_path) if os.path.exists(tombstones_path) else None
+        )
+
+class SnapshotBuilder:
+    """Builds a snapshot from batches of embedded chunks, as a full rebuild or on top of a base
+
+    Each batch goes straight into the FAISS index, the chunk store writer and
+    the BM25 postings, so callers only ever hold one batch of texts and
+    embeddings. Index types that need training buffer the first
+    INDEX_TRAIN_SAMPLE vectors and train on those. With a staging directory,
+    chunk texts and vectors are written to disk as they arrive; publishing the
+    snapshot moves them into its directory. Batches added with MinHash
+    signatures keep the snapshot's signatures complete for deduplication.
+    """
+
+    def __init__(self, store: "VectorStore", base: Optional[IndexSnapshot] = None,
+                 staging_dir: Optional[str] = None):
+        self.store = store
+        self.base = base
+        self.staging_dir = staging_dir
+        if staging_dir:
+            os.makedirs(staging_dir, exist_ok=True)
+        self.next_id = base.next_id if base else 0
+        self.index = faiss.clone_index(base.index) if base else None
+        self.needs_training = base is None and store.index_type not in ("flat", "hnsw")
+        if base is None and not self.needs_training:
+            self.index = faiss.IndexIDMap2(store._create_index(0))
+        self.added = ChunkStoreWriter(self._staging_path("added"))
+        self.lexical = BM25Builder(base.lexical if base else None)
+        self._untrained = []  # (embeddings, ids) batches waiting for the index to be trained
+        self.num_added = 0
+        self._signatures = []  # Per batch; None once a batch came without signatures
+        self._base_signatures = base.signatures if base else None
+        self.compacted = False  # Whether finish() rebuilt the index to drop tombstones
+
+    def _staging_path(self, name: str) -> Optional[str]:
+        return os.path.join(self.staging_dir, name) if self.staging_dir else None
+
+    def deduplicator(self, excluded: List[int] = ()) -> NearDuplicateIndex:
+        """A near-duplicate index over the base's chunks, minus excluded IDs
+
+        Base snapshots saved without signatures get them computed from their texts.
+        """
+        index = NearDuplicateIndex(excluded=excluded)
+        if self.base is not None and len(self.base.documents):
+            documents = self.base.documents
+            if self._base_signatures is None:
+                self._base_signatures = minhashes(documents.texts())
+            table_groups = np.array([group_of(meta) for meta in documents.meta_table], dtype=np.uint64)
+            index.add(np.asarray(documents.ids), np.asarray(self._base_signatures),
+                      table_groups[np.asarray(documents.meta_idx)])
+        return index
+
+    def add(self, chunks: List[Dict[str, Any]], embeddings: np.ndarray,
+            signatures: Optional[np.ndarray] = None) -> List[int]:
+        """Add a batch of chunks with their normalized embeddings (and MinHash signatures), returning the assigned IDs"""
+        ids = np.arange(self.next_id, self.next_id + len(chunks), dtype=np.int64)
+        self.next_id += len(chunks)
+        self.num_added += len(chunks)
+        if self._signatures is not None and len(chunks):
+            self._signatures = None if signatures is None else self._signatures + [signatures]
+        self.added.append(list(zip(ids.tolist(), chunks)), embeddings)
+        self.lexical.add(ids, (chunk["text"] for chunk in chunks))
+        if self.index is None:
+            self._untrained.append((embeddings, ids))
+            if sum(len(batch_ids) for _, batch_ids in self._untrained) >= INDEX_TRAIN_SAMPLE:
+                self._train()
+        elif len(chunks):
+            self.index.add_with_ids(embeddings, ids)
+        return ids.tolist()
+
+    def _train(self):
+        """Create and train the index on the buffered vectors, then add them"""
+        embeddings = (np.concatenate([batch for batch, _ in self._untrained]) if self._untrained
+                      else np.zeros((0, self.store.embedding_dim), dtype=np.float32))
+        ids = np.concatenate([batch_ids for _, batch_ids in self._untrained]) if self._untrained else np.zeros(0, dtype=np.int64)
+        self._untrained = []
+        index = self.store._create_index(len(embeddings))
+        if len(embeddings):
+            index.train(embeddings)
+        self.index = self.store._with_ids(index)
+        if len(embeddings):
+            self.index.add_with_ids(embeddings, ids)
+
+    def finish(self, removed_ids: List[int] = (),
+               duplicates: Optional[Dict[int, List[Dict[str, Any]]]] = None,
+               replaced_paths: List[str] = ()) -> Tuple[IndexSnapshot, int]:
+        """Remove chunks of the base and return the new snapshot and how many were removed
+
+        duplicates are the sources folded into chunks by this build. Those the base
+        recorded are kept unless their chunk was removed or their file (by
+        "path") is in replaced_paths, i.e. was deduplicated again.
+
+        Indexes that can't delete (HNSW) keep removed vectors as tombstones,
+        so replacing a few files doesn't rebuild the graph. Once tombstones
+        exceed TOMBSTONE_COMPACT_FRACTION of the index, it is rebuilt from the
+        vectors it keeps (compacted is then set).
+        """
+        if self.index is None:
+            self._train()
+        index, removed = self.index, 0
+        tombstones = self.base.tombstones if self.base is not None else np.zeros(0, dtype=np.int64)
+        if len(removed_ids):
+            ids_array = np.asarray(removed_ids, dtype=np.int64)
+            try:
+                removed = index.remove_ids(ids_array)
+            except RuntimeError:
+                # HNSW graphs can't delete nodes: searches skip tombstoned IDs instead
+                live = np.isin(ids_array, faiss.vector_to_array(index.id_map)) & ~np.isin(ids_array, tombstones)
+                removed = int(live.sum())
+                tombstones = np.union1d(tombstones, ids_array[live])
+        if len(tombstones) and len(tombstones) > TOMBSTONE_COMPACT_FRACTION * index.ntotal:
+            index, _ = self.store._rebuild_without(index, tombstones)
+            tombstones, self.compacted = None, True
+
+        documents = self.added.finish()
+        if self.base is not None:
+            # Kept base rows come first (their IDs are smaller), copied block by block
+            writer = ChunkStoreWriter(self._staging_path("chunks"))
+            writer.append_store(self.base.documents, ~np.isin(self.base.documents.ids, removed_ids))
+            writer.append_store(documents)
+            added_path, documents = documents.path, writer.finish()
+            if added_path:
+                for suffix in FILE_SUFFIXES:
+                    if os.path.exists(f"{added_path}{suffix}"):
+                        os.remove(f"{added_path}{suffix}")
+
+        lexical = self.lexical.finish(removed_ids)
+        signatures = None
+        if self._signatures is not None:
+            parts = list(self._signatures)
+            if self.base is not None and len(self.base.documents):
+                keep = ~np.isin(self.base.documents.ids, removed_ids)
+                parts.insert(0, None if self._base_signatures is None else np.asarray(self._base_signatures)[keep])
+            if all(part is not None for part in parts):
+                signatures = np.concatenate(parts) if parts else minhashes([])
+
+        removed_set, replaced = set(int(doc_id) for doc_id in removed_ids), set(replaced_paths)
+        merged = {}
+        for doc_id, sources in (self.base.duplicates if self.base is not None else {}).items():
+            sources = [source for source in sources if source.get("path") not in replaced]
+            if sources and doc_id not in removed_set:
+                merged[doc_id] = sources
+        for doc_id, sources in (duplicates or {}).items():
+            merged.setdefault(int(doc_id), []).extend(sources)
+        return IndexSnapshot(index, documents, self.next_id, lexical,
+                             signatures=signatures, duplicates=merged, tombstones=tombstones), int(removed)
+
+    def abort(self):
+        """Discard staged files of a build that will not be published"""
+        if self.staging_dir:
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
 
 class VectorStore:
-    def __init__(self):
-        self.encoder = SentenceTransformer(EMBEDDING_MODEL)
-        self.index = None
-        self.documents = []  # Store original documents with metadata
-        self.embedding_dim = self.encoder.get_sentence_embedding_dimension()
-    
-    def create_embeddings(self, texts: List[str]) -> np.ndarray:
-        """Create embeddings for texts"""
-        embeddings = self.encoder.encode(texts, convert_to_numpy=True)
+    def __init__(self, index_type: str = INDEX_TYPE, encoder=None,
+                 path: str = VECTOR_STORE_PATH, embedding_cache: Optional[EmbeddingCache] = None):
+        """encoder and embedding_cache may be shared between stores (e.g. namespaces)"""
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+        self.encoder = encoder or get_encoder()  # Any object with .name, .dim and .encode(texts)
+        self.index_type = index_type
+        self.path = path  # Default location for save/load/publish/rollback
+        self._snapshot: Optional[IndexSnapshot] = None  # Swapped as a whole, never mutated
+        self._write_lock = threading.Lock()
+        self.embedding_dim = self.encoder.dim
+        if embedding_cache is None and EMBEDDING_CACHE_ENABLED:
+            embedding_cache = EmbeddingCache(self.encoder.name, self.embedding_dim)
+        self.embedding_cache = embedding_cache
+
+    @property
+    def index(self):
+        return self._snapshot.index if self._snapshot else None
+
+    @property
+    def documents(self) -> ChunkStore:
+        """Chunk ID -> original document with metadata"""
+        return self._snapshot.documents if self._snapshot else ChunkStore.empty()
+
+    @property
+    def next_id(self) -> int:
+        return self._snapshot.next_id if self._snapshot else 0
+
+    @property
+    def version(self) -> Optional[str]:
+        """Changes whenever the searchable contents change"""
+        return self._snapshot.version if self._snapshot else None
+
+    def create_embeddings(self, texts: List[str], use_cache: bool = True) -> np.ndarray:
+        """Create L2-normalized embeddings for texts (inner product == cosine)
+
+        With the embedding cache enabled, only texts never embedded before are encoded.
+        """
+        if use_cache and self.embedding_cache is not None:
+            embeddings, missing = self.embedding_cache.get_many(texts)
+            if missing:
+                encoded = self._encode([texts[i] for i in missing])
+                embeddings[missing] = encoded
+                self.embedding_cache.put_many([texts[i] for i in missing], encoded)
+            return embeddings
+
+        return self._encode(texts)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Run the encoder and L2-normalize its output"""
+        embeddings = self.encoder.encode(texts)
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        faiss.normalize_L2(embeddings)
         return embeddings
-    
-    def build_index(self, chunked_documents: List[Dict[str, Any]]):
-        """Build FAISS index from documents"""
-        texts = [doc["text"] for doc in chunked_documents]
-        embeddings = self.create_embeddings(texts)
-        
-        # Create FAISS index
-        self.index = faiss.IndexFlatL2(self.embedding_dim)
-        self.index.add(embeddings)
-        
-        # Store documents
-        self.documents = chunked_documents
-    
-    def save(self, path: str = VECTOR_STORE_PATH):
-        """Save index and documents to disk"""
-        if self.index is None:
+
+    def _create_index(self, num_vectors: int):
+        """Create an empty inner-product index of the configured type"""
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(self.embedding_dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+            return index
+
+        if self.index_type == "ivf_flat":
+            # Keep ~39 training points per list, as recommended by FAISS
+            nlist = max(1, min(IVF_NLIST, num_vectors // 39))
+            quantizer = faiss.IndexFlatIP(self.embedding_dim)
+            index = faiss.IndexIVFFlat(quantizer, self.embedding_dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.nprobe = min(IVF_NPROBE, nlist)
+            return index
+
+        # PQ needs 2**PQ_NBITS training points per sub-quantizer; smaller corpora use SQ8
+        if self.index_type == "pq" and num_vectors >= 2 ** PQ_NBITS:
+            pq_m = max(m for m in range(1, PQ_M + 1) if self.embedding_dim % m == 0)
+            return faiss.IndexPQ(self.embedding_dim, pq_m, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+
+        if self.index_type in ("sq8", "pq"):
+            return faiss.IndexScalarQuantizer(
+                self.embedding_dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+            )
+
+        return faiss.IndexFlatIP(self.embedding_dim)
+
+    def _build_id_index(self, embeddings: np.ndarray, ids: np.ndarray):
+        """Create, train and fill an index, ID-mapped so chunks can be removed and replaced later"""
+        index = self._create_index(len(embeddings))
+        if not index.is_trained:
+            index.train(embeddings)
+        index = self._with_ids(index)
+        index.add_with_ids(embeddings, ids)
+        return index
+
+    def _with_ids(self, index):
+        """Make an index addressable by chunk ID
+
+        IVF lists store the IDs themselves. IndexIDMap2 would break them: its
+        remove_ids expects the inner index to shift the remaining rows down in
+        order, as flat-coded indexes do, which IVF lists don't.
+        """
+        return index if isinstance(index, faiss.IndexIVF) else faiss.IndexIDMap2(index)
+
+    def snapshot_builder(self, incremental: bool = False, path: Optional[str] = None) -> SnapshotBuilder:
+        """Start building a snapshot batch by batch (incremental: on top of the active one)
+
+        Chunk data is staged under the snapshot directory of path (default: this
+        store's path), so it can be moved into place when published.
+        """
+        if incremental and not self.supports_incremental():
+            raise ValueError("Index does not support incremental updates, rebuild it first")
+        staging_dir = os.path.join(self._snapshot_root(path or self.path), "staging", uuid.uuid4().hex)
+        return SnapshotBuilder(self, self._snapshot if incremental else None, staging_dir)
+
+    def _rebuild_without(self, index, ids: np.ndarray):
+        """Rebuild an ID-mapped index from its own stored vectors, minus the given IDs"""
+        all_ids = faiss.vector_to_array(index.id_map)
+        vectors = faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+        keep = ~np.isin(all_ids, ids)
+        return self._build_id_index(vectors[keep], all_ids[keep]), int((~keep).sum())
+
+    def activate(self, snapshot: IndexSnapshot):
+        """Make a snapshot the one searches use (a single reference assignment)"""
+        self._snapshot = snapshot
+
+    def supports_incremental(self) -> bool:
+        """Whether chunks can be added/removed in place (ID-mapped or IVF index)"""
+        if isinstance(self.index, faiss.IndexIDMap2):
+            # Older stores wrapped IVF indexes too, whose ID maps drift on removal: rebuild those
+            return not isinstance(faiss.downcast_index(self.index.index), faiss.IndexIVF)
+        return isinstance(self.index, faiss.IndexIVF)
+
+    def matches_index_type(self) -> bool:
+        """Whether the active snapshot was built with the configured index type
+
+        Incremental builds clone the active index, so after INDEX_TYPE changes
+        only a full rebuild switches to the new type. "pq" corpora too small
+        to train PQ are built as SQ8 and count as matching.
+        """
+        built = self._snapshot.index_type() if self._snapshot else None
+        return built == self.index_type or (self.index_type == "pq" and built == "sq8")
+
+    def _snapshot_root(self, path: str) -> str:
+        return f"{path}.snapshots"
+
+    def _lock_path(self, path: str) -> str:
+        return os.path.join(self._snapshot_root(path), "build.lock")
+
+    @contextmanager
+    def build_lock(self, path: Optional[str] = None) -> Iterator[None]:
+        """Hold the store's cross-process lock (and the embedding cache's) to build and publish
+
+        Other processes sharing the store (API workers, CLI ingestion) may have
+        published since this one loaded it, so the current snapshot is reloaded
+        first. publish() itself does not lock; callers take this around it.
+        """
+        path = path or self.path
+        with file_lock(self._lock_path(path)):
+            current = self._read_history(path)["current"]
+            if current is not None and current != self.version:
+                self.load(path)
+            if self.embedding_cache is None:
+                yield
+            else:
+                with self.embedding_cache.lock():
+                    yield
+
+    def _read_history(self, path: str) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self._snapshot_root(path), "history.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"current": None, "versions": []}
+
+    def _write_history(self, path: str, history: Dict[str, Any]):
+        """Point "current" at a snapshot; the rename makes the switch atomic on disk"""
+        history_path = os.path.join(self._snapshot_root(path), "history.json")
+        with open(f"{history_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(history, f)
+        os.replace(f"{history_path}.tmp", history_path)
+
+    def manifest_path(self) -> str:
+        """Where the ingestion manifest for the active snapshot lives"""
+        if self._snapshot and self._snapshot.path:
+            return os.path.join(self._snapshot.path, "manifest.json")
+        return f"{self.path}.manifest.json"  # Pre-snapshot stores kept it next to the index
+
+    def publish(self, snapshot: IndexSnapshot, manifest=None, path: Optional[str] = None):
+        """Persist a snapshot (with its ingestion manifest), mark it current and activate it
+
+        Older snapshots beyond SNAPSHOTS_TO_KEEP are deleted.
+        """
+        path = path or self.path
+        with self._write_lock:
+            root = self._snapshot_root(path)
+            os.makedirs(root, exist_ok=True)
+            directory = os.path.join(root, snapshot.version)
+            if snapshot.path != directory:
+                snapshot.save(directory)
+            if manifest is not None:
+                manifest.path = os.path.join(directory, "manifest.json")
+                manifest.save()
+
+            history = self._read_history(path)
+            versions = [v for v in history["versions"] if v != snapshot.version] + [snapshot.version]
+            for stale in versions[:-SNAPSHOTS_TO_KEEP]:
+                shutil.rmtree(os.path.join(root, stale), ignore_errors=True)
+            self._write_history(path, {"current": snapshot.version, "versions": versions[-SNAPSHOTS_TO_KEEP:]})
+
+            if self.embedding_cache is not None:
+                self.embedding_cache.flush()
+            self.activate(snapshot)
+
+    def save(self, path: Optional[str] = None):
+        """Save index and documents to disk as a new current snapshot"""
+        if self._snapshot is None:
             raise ValueError("No index to save")
-        
-        # Save FAISS index
-        faiss.write_index(self.index, f"{path}.faiss")
-        
-        # Save documents
-        with open(f"{path}.pkl", "wb") as f:
-            pickle.dump(self.documents, f)
-    
-    def load(self, path: str = VECTOR_STORE_PATH):
-        """Load index and documents from disk"""
+        self.publish(self._snapshot, path=path)
+
+    def load(self, path: Optional[str] = None):
+        """Load the current snapshot (or a pre-snapshot store) from disk"""
+        path = path or self.path
         try:
-            # Load FAISS index
-            self.index = faiss.read_index(f"{path}.faiss")
-            
-            # Load documents
-            with open(f"{path}.pkl", "rb") as f:
-                self.documents = pickle.load(f)
-            
+            history = self._read_history(path)
+            if history["current"]:
+                directory = os.path.join(self._snapshot_root(path), history["current"])
+                self.activate(IndexSnapshot.load(directory, history["current"]))
+            else:
+                self.activate(self._load_legacy(path))
             return True
         except:
             return False
-    
-    def similarity_search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
-        """Search for similar documents"""
-        if self.index is None:
-            return []
-        
-        # Create query embedding
-        query_embedding = self.create_embeddings([query])
-        
+
+    def _load_legacy(self, path: str) -> IndexSnapshot:
+        """Read stores saved as {path}.faiss plus a chunk store or pickle"""
+        index = faiss.read_index(f"{path}.faiss")
+        if ChunkStore.exists(f"{path}.chunks"):
+            documents = ChunkStore.load(f"{path}.chunks")
+        else:
+            with open(f"{path}.pkl", "rb") as f:
+                documents = pickle.load(f)
+            # The oldest stores kept a plain list (ID == position)
+            if isinstance(documents, list):
+                documents = dict(enumerate(documents))
+            documents = ChunkStore.from_items(documents.items())
+        return IndexSnapshot(index, documents, int(documents.ids[-1]) + 1 if len(documents) else 0)
+
+    def list_snapshots(self, path: Optional[str] = None) -> Dict[str, Any]:
+        """Versions on disk (oldest first) and which one is current"""
+        return self._read_history(path or self.path)
+
+    def rollback(self, version: Optional[str] = None, path: Optional[str] = None) -> str:
+        """Re-activate a kept snapshot (default: the one before current) and mark it current"""
+        path = path or self.path
+        with file_lock(self._lock_path(path)), self._write_lock:  # Same order as build_lock + publish
+            history = self._read_history(path)
+            versions = history["versions"]
+            if version is None:
+                if history["current"] not in versions or versions.index(history["current"]) == 0:
+                    raise ValueError("No older snapshot to roll back to")
+                version = versions[versions.index(history["current"]) - 1]
+            elif version not in versions:
+                raise ValueError(f"Unknown snapshot version '{version}'")
+
+            snapshot = IndexSnapshot.load(os.path.join(self._snapshot_root(path), version), version)
+            self._write_history(path, {"current": version, "versions": versions})
+            self.activate(snapshot)
+            return version
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "index_type": self._snapshot.index_type() if self._snapshot else None,  # As built, not as configured
+            "configured_index_type": self.index_type,
+            "encoder": self.encoder.name,
+            "version": self.version,
+            "chunks": len(self.documents),
+            "duplicate_sources": sum(len(sources) for sources in self._snapshot.duplicates.values()) if self._snapshot else 0,
+            "tombstones": len(self._snapshot.tombstones) if self._snapshot else 0,
+            "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else None
+        }
+
+    def _search_vectors(self, snapshot: IndexSnapshot, query_embeddings: np.ndarray, k: int,
+                        ef_search: Optional[int] = None, nprobe: Optional[int] = None,
+                        rerank: Optional[bool] = None,
+                        bitmap: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Raw FAISS search; compressed indexes shortlist extra candidates for exact re-ranking
+
+        bitmap (from IndexSnapshot.filter_bitmap) restricts hits to the chunk IDs it sets.
+        """
+        if rerank is None:
+            rerank = snapshot.is_compressed()
+        rerank = rerank and snapshot.documents.vectors is not None and len(snapshot.documents) > 0
+
+        selector = None
+        if bitmap is not None:
+            if not snapshot.supports_selector():
+                return self._search_rows_exact(snapshot, query_embeddings, k, snapshot.row_mask(bitmap))
+            # The selector reads the bitmap in place, which stays referenced until the search returns
+            selector = faiss.IDSelectorBitmap(len(bitmap) * 8, faiss.swig_ptr(bitmap))
+
+        params = snapshot.search_params(ef_search, nprobe, selector)
+        fetch_k = k * RERANK_FACTOR if rerank else k
+        scores, indices = snapshot.index.search(query_embeddings, fetch_k, params=params)
+        if rerank:
+            scores, indices = self._rerank(snapshot, query_embeddings, indices, k)
+        return scores, indices
+
+    def _search_rows_exact(self, snapshot: IndexSnapshot, query_embeddings: np.ndarray, k: int,
+                           row_mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact search over the masked rows' stored vectors, for indexes without selector support"""
+        if snapshot.documents.vectors is None:
+            raise ValueError("Filtered search on this index needs stored chunk vectors; re-ingest to add them")
+        rows = np.flatnonzero(row_mask)
+        exact = query_embeddings @ np.asarray(snapshot.documents.vectors[rows]).T
+        order = np.argsort(-exact, axis=1, kind="stable")[:, :k]
+        scores = np.take_along_axis(exact, order, axis=1)
+        indices = np.asarray(snapshot.documents.ids)[rows][order]
+
+        # Pad like FAISS when fewer than k rows pass the filter
+        pad = ((0, 0), (0, k - order.shape[1]))
+        return (np.pad(scores, pad, constant_values=-np.inf).astype(np.float32),
+                np.pad(indices, pad, constant_values=-1))
+
+    def _rerank(self, snapshot: IndexSnapshot, query_embeddings: np.ndarray,
+                indices: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-score a candidate shortlist against exact stored vectors and keep the top k"""
+        valid = indices != -1
+        # -1 padding is looked up as the first chunk and masked out below
+        candidates = np.where(valid, indices, snapshot.documents.ids[0])
+        vectors = snapshot.documents.vectors_for(candidates)
+        exact = np.einsum("qcd,qd->qc", vectors, query_embeddings)
+        exact[~valid] = -np.inf
+
+        order = np.argsort(-exact, axis=1, kind="stable")[:, :k]
+        scores = np.take_along_axis(exact, order, axis=1)
+        indices = np.take_along_axis(indices, order, axis=1)
+        indices[np.isneginf(scores)] = -1
+        return scores, indices
+
+    def similarity_search(self, query: str, k: int = 3,
+                          ef_search: Optional[int] = None,
+                          nprobe: Optional[int] = None,
+                          mode: Optional[str] = None,
+                          filters: Optional[Dict[str, Any]] = None,
+                          mmr: bool = False) -> List[Dict[str, Any]]:
+        """Search for similar documents
+
+        ef_search (HNSW) and nprobe (IVF) trade recall for latency on a single query.
+        mode is "dense", "lexical" or "hybrid" (default: SEARCH_MODE).
+        filters restricts hits by metadata, e.g. {"department": "hr", "type": ["pdf", "docx"]}.
+        mmr diversifies the hits and merges adjacent chunks of a document into one passage.
+        """
+        return self.similarity_search_batch([query], k, ef_search, nprobe, mode, filters, mmr)[0]
+
+    def similarity_search_batch(self, queries: List[str], k: int = 3,
+                                ef_search: Optional[int] = None,
+                                nprobe: Optional[int] = None,
+                                mode: Optional[str] = None,
+                                filters: Optional[Dict[str, Any]] = None,
+                                mmr: bool = False) -> List[List[Dict[str, Any]]]:
+        """Search for several queries at once, one result list per query
+
+        All queries are encoded in one forward pass and searched with a single
+        FAISS call, which amortizes the per-call overhead of similarity_search.
+
+        In "lexical" mode the encoder is skipped and similarity_score is the BM25
+        score. In "hybrid" mode dense and BM25 rankings are fused with reciprocal
+        rank fusion; similarity_score stays the cosine similarity and each hit
+        also carries its rrf_score.
+
+        filters are applied inside the index search (precomputed ID bitmaps), so
+        up to k matching hits are returned without over-fetching. Tombstoned
+        chunks are excluded the same way.
+
+        With mmr, MMR_CANDIDATES hits are fetched and re-ordered by maximal
+        marginal relevance; a picked chunk's direct neighbours among them are
+        merged into its passage, up to MMR_MAX_MERGED_CHUNKS chunks (metadata
+        gains "chunk_ids" and "match_start").
+        """
+        mode = mode or SEARCH_MODE
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+
+        snapshot = self._snapshot  # Use one consistent snapshot for the whole search
+        if snapshot is None or not queries:
+            return [[] for _ in queries]
+
+        bitmap = snapshot.filter_bitmap(filters) if filters else snapshot.live_bitmap
+        if bitmap is not None and not bitmap.any():
+            return [[] for _ in queries]
+        # BM25 only knows live chunks, so only metadata filters restrict its rows
+        row_mask = snapshot.row_mask(bitmap) if filters else None
+
+        num_candidates = max(k, MMR_CANDIDATES) if mmr else k
+
+        if mode == "lexical":
+            rankings = []
+            for query in queries:
+                scores, ids = snapshot.lexical.search(query, num_candidates, row_mask)
+                rankings.append((ids, scores, {}, scores))
+            if not mmr:
+                return [self._to_hits(snapshot, ids, scores) for ids, scores, _, _ in rankings]
+            return self._diversify(snapshot, rankings, k)
+
+        # Create query embeddings in one batch
+        query_embeddings = self.create_embeddings(list(queries), use_cache=False)
+
+        if mode == "hybrid":
+            rankings = self._hybrid_rankings(
+                snapshot, queries, query_embeddings, num_candidates, ef_search, nprobe, bitmap, row_mask
+            )
+            if not mmr:
+                return [self._to_hits(snapshot, ids, scores, **extra) for ids, scores, extra, _ in rankings]
+            return self._diversify(snapshot, rankings, k)
+
         # Search
-        distances, indices = self.index.search(query_embedding, k)
-        
-        # Return documents
+        scores, indices = self._search_vectors(
+            snapshot, query_embeddings, num_candidates, ef_search, nprobe, bitmap=bitmap
+        )
+        similarities = snapshot.to_similarity(scores)
+
+        if mmr:
+            valid = indices != -1
+            return self._diversify(snapshot, [
+                (indices[row][valid[row]], similarities[row][valid[row]], {}, similarities[row][valid[row]])
+                for row in range(len(queries))
+            ], k)
+
+        # FAISS pads missing hits with -1 at the end of each row, so the valid hits
+        # of every row are a prefix and row-major flattening keeps them grouped
+        valid = indices != -1
+        hits = self._to_hits(snapshot, indices[valid], similarities[valid])
+        bounds = np.concatenate(([0], np.cumsum(valid.sum(axis=1)))).tolist()
+        return [hits[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def _to_hits(self, snapshot: IndexSnapshot, ids: np.ndarray, scores: np.ndarray,
+                 **extra: np.ndarray) -> List[Dict[str, Any]]:
+        """Materialize result dicts for chunk IDs (extra score arrays are added per hit)"""
+        extra_lists = {name: values.tolist() for name, values in extra.items()}
+        hits = [
+            {"document": snapshot.documents[idx], "similarity_score": score,
+             **{name: values[i] for name, values in extra_lists.items()}}
+            for i, (idx, score) in enumerate(zip(ids.tolist(), scores.tolist()))
+        ]
+        for idx, hit in zip(ids.tolist(), hits):
+            if idx in snapshot.duplicates:
+                # Every document containing this passage: its own source first
+                metadata = hit["document"]["metadata"]
+                own = {field: metadata[field] for field in ("source", "path", "page", "type") if field in metadata}
+                metadata["sources"] = [own] + snapshot.duplicates[idx]
+        return hits
+
+    def _diversify(self, snapshot: IndexSnapshot, rankings: List[tuple], k: int) -> List[List[Dict[str, Any]]]:
+        """MMR-order each query's (ids, scores, extra scores, relevance) candidates and collapse them to k passages"""
         results = []
-        for i, idx in enumerate(indices[0]):
-            if idx != -1 and idx < len(self.documents):
-                results.append({
-                    "document": self.documents[idx],
-                    "similarity_score": float(1 / (1 + distances[0][i]))  # Convert distance to similarity
-                })
-        
-        return results
\ No newline at end of file
+        for ids, scores, extra, relevance in rankings:
+            if snapshot.documents.vectors is not None:
+                vectors = snapshot.documents.vectors_for(ids)
+            else:
+                # Searches don't hold the embedding cache's lock, so they leave the cache alone
+                vectors = self.create_embeddings([snapshot.documents[idx]["text"] for idx in ids.tolist()],
+                                                 use_cache=False)
+            # Scale relevance to [0, 1] so it is comparable with cosine redundancy
+            relevance = np.asarray(relevance, dtype=np.float32)
+            top = relevance.max(initial=0.0)
+            order = mmr_order(relevance / top if top > 0 else relevance, vectors)
+            hits = self._to_hits(snapshot, ids[order], scores[order],
+                                 **{name: values[order] for name, values in extra.items()})
+            results.append(collapse_adjacent(hits, k))
+        return results
+
+    def _hybrid_rankings(self, snapshot: IndexSnapshot, queries: List[str], query_embeddings: np.ndarray,
+                         k: int, ef_search: Optional[int], nprobe: Optional[int],
+                         bitmap: Optional[np.ndarray] = None,
+                         row_mask: Optional[np.ndarray] = None) -> List[tuple]:
+        """Fuse dense and BM25 rankings with reciprocal rank fusion
+
+        Returns per query the top-k (ids, cosine similarities, {"rrf_score": ...}, rrf scores).
+        """
+        num_candidates = max(k, HYBRID_CANDIDATES)
+        dense_scores, dense_ids = self._search_vectors(
+            snapshot, query_embeddings, num_candidates, ef_search, nprobe, bitmap=bitmap
+        )
+        dense_similarities = snapshot.to_similarity(dense_scores)
+
+        results = []
+        for row, query in enumerate(queries):
+            _, lexical_ids = snapshot.lexical.search(query, num_candidates, row_mask)
+            valid = dense_ids[row] != -1
+            rankings = [dense_ids[row][valid], lexical_ids]
+
+            # score(d) = sum over rankings of 1 / (RRF_K + rank(d)), ranks starting at 1
+            ids, inverse = np.unique(np.concatenate(rankings), return_inverse=True)
+            weights = np.concatenate([1.0 / (RRF_K + np.arange(1, len(r) + 1)) for r in rankings])
+            rrf_scores = np.bincount(inverse, weights=weights, minlength=len(ids))
+            top = np.argsort(-rrf_scores, kind="stable")[:k]
+            top_ids = ids[top]
+
+            # Report cosine similarity even for hits only the lexical ranking found
+            if snapshot.documents.vectors is not None:
+                cosine = snapshot.documents.vectors_for(top_ids) @ query_embeddings[row]
+            else:
+                dense_lookup = dict(zip(dense_ids[row][valid].tolist(), dense_similarities[row][valid].tolist()))
+                cosine = np.array([dense_lookup.get(idx, 0.0) for idx in top_ids.tolist()])
+            results.append((top_ids, np.asarray(cosine), {"rrf_score": rrf_scores[top]}, rrf_scores[top]))
+        return results
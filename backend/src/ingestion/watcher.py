@@ -0,0 +1,203 @@
+import ctypes
+import ctypes.util
+import functools
+import os
+import select
+import struct
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from src.config import WATCH_DEBOUNCE_SECONDS, WATCH_POLL_INTERVAL
+from src.ingestion.document_loader import DocumentLoader
+
+DOCUMENT_EXTENSIONS = (".pdf", ".docx")
+
+# inotify(7) event flags
+IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO = 0x8, 0x40, 0x80
+IN_CREATE, IN_DELETE, IN_DELETE_SELF = 0x100, 0x200, 0x400
+IN_Q_OVERFLOW, IN_IGNORED, IN_ISDIR = 0x4000, 0x8000, 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+class Inotify:
+    """Minimal inotify binding through libc (Linux only; raises OSError elsewhere)"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name or not hasattr(ctypes.CDLL(libc_name), "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Cannot watch {path}")
+        return wd
+
+    def read(self, timeout: float):
+        """Events (wd, mask, name) that arrive within timeout seconds"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events, offset = [], 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", "replace")
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class DocumentWatcher:
+    """Queues an incremental ingestion job once a namespace's documents stop changing
+
+    Changes are noticed with inotify (recursive watches over each documents
+    directory), or by comparing file mtimes/sizes every poll_interval seconds
+    where inotify is unavailable. A namespace is only submitted after
+    debounce seconds without further changes, so copying a folder of
+    policies triggers one run; the job manager folds it into an ingestion
+    already queued for that namespace. Incremental runs re-process only the
+    files whose content changed (per the manifest).
+    """
+
+    def __init__(self, jobs, registry, debounce: float = WATCH_DEBOUNCE_SECONDS,
+                 poll_interval: float = WATCH_POLL_INTERVAL, use_inotify: bool = True):
+        self.jobs = jobs
+        self.registry = registry
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.mode: Optional[str] = None
+        self._pending: Dict[str, float] = {}  # namespace -> time of its latest change
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._loader: Optional[DocumentLoader] = None
+        self.events = 0
+        self.jobs_submitted = 0
+
+    def directories(self) -> Dict[str, str]:
+        """Documents directory of every namespace that has one"""
+        return {name: self.registry.documents_dir(name) for name in self.registry.names()
+                if os.path.isdir(self.registry.documents_dir(name))}
+
+    def start(self):
+        try:
+            if not self.use_inotify:
+                raise OSError("inotify disabled")
+            inotify = Inotify()
+            self.mode = "inotify"
+            watch = functools.partial(self._watch_inotify, inotify)
+        except OSError:
+            self.mode = "polling"
+            watch = self._watch_polling
+        self._stop.clear()
+        self._threads = [threading.Thread(target=target, name=f"documents-watcher-{i}", daemon=True)
+                         for i, target in enumerate((watch, self._dispatch))]
+        for thread in self._threads:
+            thread.start()
+        print(f"👀 Watching documents for changes ({self.mode}, {self.debounce:g}s debounce)")
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def changed(self, namespace: str):
+        """Record a change; the namespace is submitted once changes stop for debounce seconds"""
+        with self._lock:
+            self._pending[namespace] = time.monotonic()
+            self.events += 1
+
+    def _dispatch(self):
+        while not self._stop.wait(min(self.debounce / 4, 0.5)):
+            now = time.monotonic()
+            with self._lock:
+                ready = [name for name, last in self._pending.items() if now - last >= self.debounce]
+                for name in ready:
+                    del self._pending[name]
+            for name in ready:
+                job, coalesced = self.jobs.submit(name)
+                self.jobs_submitted += 0 if coalesced else 1
+                print(f"👀 Documents of '{name}' changed, ingestion job {job.id}"
+                      + (" (joined queued job)" if coalesced else ""))
+
+    def _watch_inotify(self, inotify: Inotify):
+        """Namespaces created after start() are watched from the next start"""
+        watches: Dict[int, Tuple[str, str]] = {}  # wd -> (namespace, directory)
+
+        def add_tree(namespace: str, root: str):
+            for directory, _, _ in os.walk(root):
+                try:
+                    watches[inotify.add_watch(directory, WATCH_MASK)] = (namespace, directory)
+                except OSError as e:
+                    print(f"⚠️ Not watching {directory}: {e}")
+
+        for namespace, root in self.directories().items():
+            add_tree(namespace, root)
+        try:
+            while not self._stop.is_set():
+                for wd, mask, name in inotify.read(timeout=0.5):
+                    if mask & IN_Q_OVERFLOW:
+                        # Events were dropped: re-check every namespace
+                        for namespace, _ in set(watches.values()):
+                            self.changed(namespace)
+                        continue
+                    if wd not in watches:
+                        continue
+                    namespace, directory = watches[wd]
+                    if mask & IN_IGNORED:
+                        del watches[wd]  # Directory deleted or unmounted
+                    elif mask & IN_ISDIR:
+                        if mask & (IN_CREATE | IN_MOVED_TO):
+                            add_tree(namespace, os.path.join(directory, name))
+                        if mask & (IN_CREATE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE):
+                            self.changed(namespace)
+                    elif name.endswith(DOCUMENT_EXTENSIONS) and not mask & IN_CREATE:
+                        # Files count once written (CLOSE_WRITE), not when created empty
+                        self.changed(namespace)
+        finally:
+            inotify.close()
+
+    def _scan(self, root: str) -> Dict[str, Tuple[float, int]]:
+        state = {}
+        for rel_path in self._loader.list_document_files(root):
+            try:
+                stat = os.stat(os.path.join(root, rel_path))
+                state[rel_path] = (stat.st_mtime, stat.st_size)
+            except OSError:
+                pass  # Deleted between listing and stat
+        return state
+
+    def _watch_polling(self):
+        self._loader = self._loader or DocumentLoader()
+        states = {namespace: self._scan(root) for namespace, root in self.directories().items()}
+        while not self._stop.wait(self.poll_interval):
+            # Namespaces created since the last scan are picked up too
+            for namespace, root in self.directories().items():
+                state = self._scan(root)
+                if state != states.get(namespace, {}):
+                    self.changed(namespace)
+                states[namespace] = state
+
+    def stats(self):
+        with self._lock:
+            pending = sorted(self._pending)
+        return {
+            "mode": self.mode,
+            "running": bool(self._threads),
+            "debounce_seconds": self.debounce,
+            "events": self.events,
+            "pending": pending,
+            "jobs_submitted": self.jobs_submitted
+        }
@@ -1,16 +1,23 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+import asyncio
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import Any, Optional
 import uvicorn
 
 # Correct import - process_email is now available
-from src.agent.email_agent import process_email
-from src.ingestion import run_ingestion
-from src.models import EmailInput, EmailResponse, IngestResponse
+from src.agent.email_agent import aprocess_email, email_path_stats, response_cache, llm_cache
+from src.ingestion import jobs, namespaces, watcher
+from src.agent.tools import search_cache
+from src.config import WATCH_DOCUMENTS, MAX_CONCURRENT_EMAILS
+from src.models import EmailInput, EmailResponse, IngestJobResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI(title="AI Email Assistant API")
 
+# Per-worker limit on emails processed at once; further requests wait for a slot
+email_slots = asyncio.Semaphore(MAX_CONCURRENT_EMAILS)
+email_load = {"in_flight": 0, "waiting": 0}
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -23,25 +30,69 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def start_documents_watcher():
+    if WATCH_DOCUMENTS:
+        watcher.start()
+
+@app.on_event("shutdown")
+def stop_documents_watcher():
+    if watcher.mode:
+        watcher.stop()
+
 @app.get("/")
 def read_root():
     return {"message": "AI Email Assistant API is active."}
 
-@app.post("/ingest", response_model=IngestResponse)
-def trigger_ingestion(background_tasks: BackgroundTasks):
+@app.post("/ingest", response_model=IngestJobResponse, status_code=202)
+def trigger_ingestion(namespace: Optional[str] = None, full_rebuild: bool = False):
+    """Queue an ingestion job; poll GET /ingest/{job_id} for its progress and result"""
+    try:
+        namespace = namespaces.resolve(namespace)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     try:
-        background_tasks.add_task(run_ingestion)
-        return IngestResponse(
-            status="started",
-            documents_processed=0,
-            chunks_created=0,
-            message="Ingestion started in background."
-        )
+        job, coalesced = jobs.submit(namespace, full_rebuild)
+        return IngestJobResponse(**job.to_dict(), coalesced=coalesced)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/ingest/{job_id}", response_model=IngestJobResponse)
+def get_ingestion_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingestion job '{job_id}'")
+    return IngestJobResponse(**job.to_dict())
+
+@app.get("/admin/namespaces")
+def list_namespaces():
+    return {"namespaces": namespaces.names(), **namespaces.stats()}
+
+@app.get("/admin/snapshots")
+def list_snapshots(namespace: Optional[str] = None):
+    try:
+        return namespaces.get(namespace).list_snapshots()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/admin/rollback")
+def rollback_snapshot(version: Optional[str] = None, namespace: Optional[str] = None):
+    """(Admin) Swap back to a kept index snapshot (default: the previous one)"""
+    try:
+        active = namespaces.get(namespace).rollback(version)
+        return {"status": "success", "version": active}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/process-email", response_model=EmailResponse)
 async def process_email_endpoint(email: EmailInput):
+    try:
+        namespace = namespaces.resolve(email.namespace)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         # Input validation
         if not email.body or not email.body.strip():
@@ -53,8 +104,18 @@ async def process_email_endpoint(email: EmailInput):
         # Format the full email content
         full_content = f"Subject: {email.subject}\nFrom: {email.sender}\n\n{email.body}"
 
-        # Process the email
-        response = process_email(full_content)
+        # Process the email without blocking the event loop
+        email_load["waiting"] += 1
+        try:
+            await email_slots.acquire()
+        finally:
+            email_load["waiting"] -= 1
+        email_load["in_flight"] += 1
+        try:
+            response = await aprocess_email(full_content, namespace)
+        finally:
+            email_load["in_flight"] -= 1
+            email_slots.release()
         
         return response
 
@@ -80,6 +141,20 @@ async def process_email_endpoint(email: EmailInput):
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/stats")
+def get_stats():
+    return {
+        "vector_store": namespaces.default.stats(),
+        "namespaces": namespaces.stats(),
+        "search_cache": search_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "llm_cache": llm_cache.stats() if llm_cache else None,
+        "email_concurrency": {"limit": MAX_CONCURRENT_EMAILS, **email_load},
+        "email_paths": email_path_stats(),
+        "ingestion_jobs": jobs.stats(),
+        "documents_watcher": watcher.stats()
+    }
+
 if __name__ == "__main__":
     uvicorn.run(
         "src.main:app",
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
+from datetime import datetime
 from enum import Enum
 
 class EmailCategory(str, Enum):
@@ -14,6 +15,7 @@ class EmailInput(BaseModel):
     body: str = Field(..., description="Email body content")
     sender: str = Field(..., description="Sender email address")
     recipient: Optional[str] = Field(None, description="Recipient email address")
+    namespace: Optional[str] = Field(None, description="Business unit whose documents to search (default namespace if omitted)")
 
 class EmailResponse(BaseModel):
     draft_reply: str = Field(..., description="Generated email reply")
@@ -23,9 +25,40 @@ class EmailResponse(BaseModel):
     requires_human_review: bool = Field(False, description="Whether human review is needed")
     clarification_needed: bool = Field(False, description="Whether clarification is needed")
     clarification_question: Optional[str] = Field(None, description="Question to ask sender")
+    llm_calls: int = Field(0, description="LLM round trips spent on this email")
+    llm_cache_hits: int = Field(0, description="LLM calls answered from the LLM cache instead")
+    processing_path: Optional[str] = Field(None, description="How the reply was produced: fast_path, agent or response_cache")
+    cache_hit: bool = Field(False, description="Whether the reply was reused from a semantically similar answered email")
+    cache_similarity: Optional[float] = Field(None, description="Similarity to the cached email on a cache hit")
 
 class IngestResponse(BaseModel):
     status: str
-    documents_processed: int
-    chunks_created: int
-    message: str
\ No newline at end of file
+    namespace: Optional[str] = None
+    documents_processed: int = 0
+    chunks_created: int = 0
+    message: str
+    chunks_removed: int = 0
+    chunks_deduplicated: int = Field(0, description="Chunks not indexed because they nearly duplicate an indexed chunk")
+    dedup_ratio: float = Field(0.0, description="Share of this run's chunks that were deduplicated")
+    files_added: List[str] = Field(default=[], description="Newly ingested files")
+    files_updated: List[str] = Field(default=[], description="Files re-ingested after a content change")
+    files_removed: List[str] = Field(default=[], description="Files whose chunks were removed")
+    files_unchanged: int = Field(0, description="Files skipped because their content hash is unchanged")
+    files_failed: List[Dict[str, str]] = Field(default=[], description="Files skipped because they could not be parsed, with the error")
+    pipeline_stats: Optional[Dict[str, Any]] = Field(None, description="Per-stage items, busy seconds and throughput of the ingestion pipeline")
+
+class IngestJobResponse(BaseModel):
+    job_id: str
+    namespace: str
+    full_rebuild: bool = False
+    state: str = Field(..., description="queued, running, succeeded or failed")
+    requests: int = Field(1, description="/ingest calls coalesced into this job")
+    coalesced: bool = Field(False, description="Whether this request joined an already queued job")
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    elapsed_seconds: Optional[float] = None
+    embeddings_per_second: Optional[float] = None
+    progress: Dict[str, Any] = Field(default={}, description="Current phase, files/chunks processed so far and per-stage pipeline stats")
+    result: Optional[IngestResponse] = Field(None, description="Outcome of the run once finished")
+    error: Optional[str] = None
\ No newline at end of file